@@ -1,32 +1,321 @@
-from transformers import pipeline
-from langdetect import detect
+import os
 import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# ---------------- MODEL LAZY LOAD ----------------
+import metrics
+from batcher import MicroBatcher, Overloaded
+from cache import LRUCache, MISSING
+from signals import SIGNAL_PHRASES, as_signals, extract_signals
+from language_id import detect_language
+
+# ---------------- MODEL BACKGROUND LOAD ----------------
+
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+
+# "torch" = transformers pipeline, "onnx" = int8 ONNX Runtime (onnx_backend.py)
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "torch").strip().lower()
 
 emotion_pipe = None
 emotion_available = True   # global flag
 
+# "cold" -> "loading" -> "ready" | "failed"; requests are served with
+# heuristic_emotion until the model is ready
+model_state = "cold"
+model_timings = {}
+_warmup_lock = threading.Lock()
 
-def get_emotion_pipe():
-    global emotion_pipe, emotion_available
 
-    if emotion_pipe is None and emotion_available:
-        try:
-            print("Loading emotion model (lazy)...")
-            emotion_pipe = pipeline(
-                "text-classification",
-                model="j-hartmann/emotion-english-distilroberta-base",
-                top_k=3
-            )
-        except Exception as e:
-            print("Emotion model load failed — fallback mode:", e)
-            emotion_available = False
-            emotion_pipe = None
+def load_emotion_model():
+    # transformers (and torch) are imported here, not at module import,
+    # so the web process starts answering immediately
+    if EMOTION_BACKEND == "onnx":
+        from onnx_backend import load_onnx_classifier
+        return load_onnx_classifier(EMOTION_MODEL)
+
+    from transformers import pipeline
+
+    return pipeline(
+        "text-classification",
+        model=EMOTION_MODEL,
+        top_k=3
+    )
+
+
+def warm_up():
+    global emotion_pipe, emotion_available, model_state
+
+    try:
+        started = time.perf_counter()
+        if _preloaded_pipe is not None:
+            # weights inherited from the pre-fork master, shared copy-on-write
+            pipe = _preloaded_pipe
+            model_timings["preloaded"] = True
+        else:
+            print("Loading emotion model (background, %s backend)..." % EMOTION_BACKEND)
+            pipe = load_emotion_model()
+        loaded = time.perf_counter()
+
+        configure_threads()
+
+        # first forward pass pays for lazy kernel / allocator setup
+        pipe(["warming up the emotion model"], truncation=True)
+        warmed = time.perf_counter()
+
+        model_timings["load_s"] = round(loaded - started, 3)
+        model_timings["warmup_s"] = round(warmed - loaded, 3)
+        model_timings["ready_at"] = warmed
+
+        # single reference swap: requests see either no model or a warm one
+        emotion_pipe = pipe
+        model_state = "ready"
+        print("Emotion model ready — load %.2fs, warm-up %.2fs"
+              % (model_timings["load_s"], model_timings["warmup_s"]))
+
+    except Exception as e:
+        print("Emotion model load failed — fallback mode:", e)
+        emotion_available = False
+        model_state = "failed"
+
+
+def start_warmup():
+    global model_state
+
+    with _warmup_lock:
+        if model_state != "cold":
+            return
+        model_state = "loading"
+
+    threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+
+
+# ---------------- PRELOAD (multi-worker) ----------------
+
+# set in a pre-fork server's master process (see gunicorn.conf.py); each
+# worker then only runs its own warm-up pass
+_preloaded_pipe = None
+
+
+def preload_model() -> bool:
+    global _preloaded_pipe
+
+    if EMOTION_BACKEND == "onnx":
+        # onnxruntime sessions own thread pools that do not survive fork
+        print("ONNX backend — each worker loads its own session")
+        return False
+
+    try:
+        import torch
+
+        # no forward pass and a single intra-op thread in the master, so
+        # no OpenMP pool exists at fork time
+        torch.set_num_threads(1)
+
+        started = time.perf_counter()
+        _preloaded_pipe = load_emotion_model()
+        print("Emotion model preloaded for workers in %.2fs" % (time.perf_counter() - started))
+        return True
+
+    except Exception as e:
+        print("Emotion model preload failed — workers load their own:", e)
+        return False
+
+
+def set_inference_threads(n: int):
+    try:
+        import torch
+        torch.set_num_threads(max(1, n))
+    except ImportError:
+        pass
+
+
+def get_emotion_pipe():
+    # never blocks a request on the model load
+    if model_state == "cold":
+        start_warmup()
 
     return emotion_pipe
 
 
+# ---------------- BATCHED INFERENCE ----------------
+
+# concurrent analyze_text calls share one padded forward pass; the async
+# path submits straight from the event loop, so batch size is bounded by
+# concurrent requests, not by ANALYSIS_WORKERS
+BATCH_MAX_SIZE = int(os.getenv("EMOTION_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("EMOTION_BATCH_MAX_WAIT_MS", "10"))
+
+# ---------------- ADMISSION CONTROL ----------------
+
+# intra-op threads x concurrent batches should not exceed the cores this
+# process has; 0 threads = torch default (or the gunicorn post_fork split)
+TORCH_THREADS = int(os.getenv("EMOTION_TORCH_THREADS", "0"))
+MAX_CONCURRENT = int(os.getenv("EMOTION_MAX_CONCURRENT", "1"))
+MAX_QUEUE = int(os.getenv("EMOTION_MAX_QUEUE", "64"))
+QUEUE_DEADLINE_MS = float(os.getenv("EMOTION_QUEUE_DEADLINE_MS", "500"))
+
+# what an overloaded request gets: "degrade" = heuristic_emotion,
+# "reject" = Overloaded is raised (the API answers 429)
+SHED_POLICY = os.getenv("EMOTION_SHED_POLICY", "degrade").strip().lower()
+
+shed_stats = {"degraded": 0, "rejected": 0}
+
+EMOTION_FALLBACKS = metrics.counter(
+    "emotion_fallbacks_total", "Analyses served by heuristic_emotion instead of the model",
+    labels=("reason",)
+)
+
+
+def configure_threads():
+    if TORCH_THREADS:
+        set_inference_threads(TORCH_THREADS)
+        return
+
+    if MAX_CONCURRENT > 1 and EMOTION_BACKEND != "onnx":
+        import torch
+        set_inference_threads(torch.get_num_threads() // MAX_CONCURRENT)
+
+
+def _as_label_list(result):
+    # pipelines return a bare dict instead of a list when top_k == 1
+    return [result] if isinstance(result, dict) else result
+
+
+# ---------------- LONG MESSAGES ----------------
+
+# bounded cost per message: at most EMOTION_MAX_TOKENS per sequence and,
+# for the chunk strategies, at most EMOTION_MAX_CHUNKS sequences
+#   head       - keep the first EMOTION_MAX_TOKENS tokens
+#   chunk_max  - overlapping windows, per-label max score across windows
+#   chunk_mean - overlapping windows, per-label mean score across windows
+EMOTION_MAX_TOKENS = int(os.getenv("EMOTION_MAX_TOKENS", "128"))
+EMOTION_LONG_STRATEGY = os.getenv("EMOTION_LONG_STRATEGY", "head").strip().lower()
+EMOTION_MAX_CHUNKS = int(os.getenv("EMOTION_MAX_CHUNKS", "4"))
+
+CHARS_PER_TOKEN = 4   # fallback estimate when no offsets are available
+
+
+def token_spans(tokenizer, text: str):
+    # (start, end) character span of every token, specials excluded
+    if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+        enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return enc["offset_mapping"]
+
+    return [(i, min(i + CHARS_PER_TOKEN, len(text))) for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+def split_long_text(tokenizer, text: str, strategy: str = None):
+    strategy = strategy or EMOTION_LONG_STRATEGY
+    window = EMOTION_MAX_TOKENS
+    if tokenizer is not None:
+        window -= tokenizer.num_special_tokens_to_add()
+
+    # byte-level BPE never needs more than 4 tokens per character
+    if len(text) * 4 <= window:
+        return [text]
+
+    spans = token_spans(tokenizer, text)
+    n = len(spans)
+    if n <= window:
+        return [text]
+
+    if strategy not in ("chunk_max", "chunk_mean"):
+        return [text[:spans[window - 1][1]]]
+
+    stride = max(1, window * 3 // 4)
+    starts = list(range(0, n - window + stride, stride))
+
+    # too many windows: spread them over the whole message instead of
+    # only reading its beginning
+    k = max(1, EMOTION_MAX_CHUNKS)
+    if len(starts) > k:
+        last = n - window
+        starts = [0] if k == 1 else [round(i * last / (k - 1)) for i in range(k)]
+
+    return [text[spans[s][0]:spans[min(s + window, n) - 1][1]] for s in starts]
+
+
+def aggregate_chunks(results, strategy: str, top_k: int = 3):
+    totals = {}
+    for labels in results:
+        for e in _as_label_list(labels):
+            score = float(e["score"])
+            if strategy == "chunk_max":
+                totals[e["label"]] = max(totals.get(e["label"], 0.0), score)
+            else:
+                totals[e["label"]] = totals.get(e["label"], 0.0) + score / len(results)
+
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+    return [{"label": label, "score": score} for label, score in ranked[:top_k]]
+
+
+def classify_batch(texts):
+    pipe = get_emotion_pipe()
+    if pipe is None:
+        raise RuntimeError("emotion model unavailable")
+
+    tokenizer = getattr(pipe, "tokenizer", None)
+    groups = [split_long_text(tokenizer, t) for t in texts]
+
+    if all(len(g) == 1 for g in groups):
+        pieces = [g[0] for g in groups]
+        out = pipe(pieces, batch_size=len(pieces), truncation=True)
+        return [_as_label_list(r) for r in out]
+
+    # every window of every message goes through one padded forward pass;
+    # all labels are scored so windows aggregate over the full distribution
+    flat = [c for g in groups for c in g]
+    out = pipe(flat, batch_size=len(flat), truncation=True, top_k=None)
+
+    results, i = [], 0
+    for g in groups:
+        results.append(aggregate_chunks(out[i:i + len(g)], EMOTION_LONG_STRATEGY))
+        i += len(g)
+    return results
+
+
+emotion_batcher = MicroBatcher(
+    classify_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    name="emotion-batcher",
+    workers=MAX_CONCURRENT,
+    max_queue=MAX_QUEUE,
+    max_queue_wait_ms=QUEUE_DEADLINE_MS
+)
+
+
+def check_admission():
+    # fast pre-check so a rejected request is turned away before any work
+    if SHED_POLICY == "reject" and model_state == "ready" and MAX_QUEUE \
+            and emotion_batcher.depth() >= MAX_QUEUE:
+        shed_stats["rejected"] += 1
+        raise Overloaded("emotion inference queue full")
+
+
+def inference_stats() -> dict:
+    return {**emotion_batcher.stats(), **shed_stats, "policy": SHED_POLICY}
+
+
+@metrics.collector
+def inference_metrics():
+    b = emotion_batcher.stats()
+    return [
+        ("emotion_queue_depth", "gauge", "Messages waiting for emotion inference", b["queue_depth"]),
+        ("emotion_in_flight", "gauge", "Emotion batches running", b["in_flight"]),
+        ("emotion_mean_batch_size", "gauge", "Mean messages per emotion batch", b["mean_batch_size"]),
+        ("emotion_queue_wait_p95_seconds", "gauge", "p95 queue wait over recent messages", b["wait_p95_ms"] / 1000),
+        ("emotion_shed_total", "counter", "Messages shed by admission control", b["shed_full"] + b["shed_stale"]),
+        ("emotion_model_ready", "gauge", "1 once the emotion model is warm", int(model_state == "ready")),
+        ("analysis_cache_hits_total", "counter", "Analyses answered from cache", analysis_cache.hits),
+        ("analysis_cache_misses_total", "counter", "Analyses not in cache", analysis_cache.misses),
+    ]
+
+
 # ---------------- LABEL GROUPS ----------------
 
 NEG = {"sadness", "anger", "fear", "disgust"}
@@ -35,67 +324,59 @@ POS = {"joy", "happiness", "surprise", "love"}
 
 # ---------------- SLANG PATTERNS ----------------
 
-DISTRESS_PATTERNS = [
-    "i'm cooked", "im cooked", "i am cooked",
-    "feeling cooked",
-    "i'm done", "im done",
-    "i'm finished", "im finished",
-    "i cant anymore", "i can't anymore",
-    "i give up",
-    "i'm not okay", "im not okay",
-    "this is bad for me"
-]
-
-WIN_PATTERNS = [
-    "we cooked",
-    "we are cooking",
-    "we're cooking",
-    "they got cooked",
-    "he got cooked",
-    "she got cooked"
-]
-
-GRIEF_PHRASES = [
-    "died", "passed away", "lost my",
-    "funeral", "death", "put to sleep"
-]
+# phrase tables live in signals.py and are matched in one compiled pass
+DISTRESS_PATTERNS = SIGNAL_PHRASES["distress_slang"]
+WIN_PATTERNS = SIGNAL_PHRASES["win_slang"]
+GRIEF_PHRASES = SIGNAL_PHRASES["grief_phrase"]
 
 
 # ---------------- STYLE SIGNALS ----------------
 
+# byte tables for the ASCII fast path: deleting everything except letters
+# (or capitals) leaves exactly the characters to count
+_NOT_ALPHA = bytes(b for b in range(128) if not chr(b).isalpha()) + bytes(range(128, 256))
+_NOT_UPPER = bytes(b for b in range(128) if not chr(b).isupper()) + bytes(range(128, 256))
+
+
 def detect_caps_intensity(text: str) -> bool:
-    letters = [c for c in text if c.isalpha()]
-    if not letters:
-        return False
-    return sum(c.isupper() for c in letters) / len(letters) > 0.6
+    if text.isascii():
+        raw = text.encode("ascii")
+        letters = len(raw.translate(None, _NOT_ALPHA))
+        upper = len(raw.translate(None, _NOT_UPPER))
+    else:
+        letters = upper = 0
+        for c in text:
+            if c.isalpha():
+                letters += 1
+                upper += c.isupper()
+
+    return letters > 0 and upper / letters > 0.6
 
 
 def detect_stretch_words(text: str) -> bool:
     return bool(re.search(r"(.)\1{3,}", text))
 
 
-def detect_bro_style(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in ["bro", "dude", "man", "bruh"])
+def detect_bro_style(text) -> bool:
+    return as_signals(text).has("bro_style")
 
 
 # ---------------- OVERRIDES ----------------
 
-def grief_override(text: str) -> bool:
-    t = text.lower()
-    return any(p in t for p in GRIEF_PHRASES)
+def grief_override(text) -> bool:
+    return as_signals(text).has("grief_phrase")
 
 
-def distress_slang_override(text: str) -> bool:
-    t = text.lower()
+def distress_slang_override(text) -> bool:
+    sig = as_signals(text)
 
-    if any(p in t for p in WIN_PATTERNS):
+    if sig.has("win_slang"):
         return False
 
-    if any(p in t for p in DISTRESS_PATTERNS):
+    if sig.has("distress_slang"):
         return True
 
-    if "cooked" in t and any(x in t for x in ["i'm", "im", "i am", "feeling", "so", "too"]):
+    if sig.has("cooked") and sig.has("self_ref"):
         return True
 
     return False
@@ -103,13 +384,13 @@ def distress_slang_override(text: str) -> bool:
 
 # ---------------- FALLBACK HEURISTIC ----------------
 
-def heuristic_emotion(text: str):
-    t = text.lower()
+def heuristic_emotion(text):
+    sig = as_signals(text)
 
-    if any(w in t for w in ["yay", "finally", "won", "got it", "success"]):
+    if sig.has("happy_hint"):
         return "super_happy"
 
-    if any(w in t for w in ["sad", "tired", "overwhelmed", "cry", "done"]):
+    if sig.has("sad_hint"):
         return "distress"
 
     return "neutral"
@@ -134,9 +415,40 @@ def overall_emotion(emotions):
     return "neutral"
 
 
+# ---------------- RESULT CACHE ----------------
+
+# bump when detectors or overrides change so stale results are never served
+ANALYZER_VERSION = "1"
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "4096"))
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+analysis_cache = LRUCache(
+    max_entries=ANALYSIS_CACHE_SIZE,
+    max_bytes=ANALYSIS_CACHE_MAX_BYTES,
+    sizeof=lambda a: len(json.dumps(a)),
+    name="analysis"
+)
+
+
+def analysis_key(clean: str, backend: str, detect_lang: bool) -> str:
+    raw = f"{ANALYZER_VERSION}\0{backend}\0{int(detect_lang)}\0{clean}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def copy_analysis(a):
+    # callers mutate the result (e.g. fill in language), never the cached one
+    return {**a, "emotions": [dict(e) for e in a["emotions"]]}
+
+
 # ---------------- MAIN ANALYZER ----------------
 
-def analyze_text(text: str):
+def begin_analysis(text: str, detect_lang: bool = True):
+    """
+    Everything before the model: (result, None) when the answer needs no
+    inference (empty text, cache hit), else (None, pending) for
+    finish_analysis.
+    """
 
     if not text or not text.strip():
         return {
@@ -146,47 +458,134 @@ def analyze_text(text: str):
             "caps_intense": False,
             "stretch_intense": False,
             "bro_style": False
-        }
+        }, None
 
     clean = text.strip()
 
-    # ---- language detect ----
-    try:
-        lang = "en" if len(clean) < 20 else detect(clean)
-    except:
-        lang = "unknown"
+    # ---- model inference (safe lazy) ----
+    pipe = get_emotion_pipe()
+
+    # ---- cache lookup (keyed by model, so a model change invalidates) ----
+    key = analysis_key(clean, EMOTION_MODEL + ":" + EMOTION_BACKEND if pipe else "heuristic", detect_lang)
 
+    cached = analysis_cache.get(key)
+    if cached is not MISSING:
+        return copy_analysis(cached), None
+
+    return None, {
+        "clean": clean,
+        "key": key,
+        "sig": extract_signals(clean),
+        # callers may run language detection as a separate stage
+        "lang": detect_language(clean) if detect_lang else None,
+        "use_model": bool(pipe),
+    }
+
+
+def finish_analysis(pending, emo=None, error=None):
+    """Scores, overrides and style detectors once the model has answered."""
+
+    clean, sig = pending["clean"], pending["sig"]
+    cacheable = True
     emotions = []
     overall = "neutral"
 
-    # ---- model inference (safe lazy) ----
-    pipe = get_emotion_pipe()
-
-    if pipe:
-        try:
-            emo = pipe(clean)[0]
-            emotions = [
-                {"label": e["label"], "score": float(e["score"])}
-                for e in emo
-            ]
-            overall = overall_emotion(emotions)
-        except Exception as e:
-            print("Emotion inference failed:", e)
-            overall = heuristic_emotion(clean)
+    if not pending["use_model"]:
+        EMOTION_FALLBACKS.inc(reason="model_" + model_state)
+        overall = heuristic_emotion(sig)
+    elif isinstance(error, Overloaded):
+        if SHED_POLICY == "reject":
+            shed_stats["rejected"] += 1
+            raise error
+        shed_stats["degraded"] += 1
+        EMOTION_FALLBACKS.inc(reason="overloaded")
+        overall = heuristic_emotion(sig)
+        cacheable = False
+    elif error is not None:
+        print("Emotion inference failed:", error)
+        EMOTION_FALLBACKS.inc(reason="error")
+        overall = heuristic_emotion(sig)
+        cacheable = False
     else:
-        overall = heuristic_emotion(clean)
+        emotions = [
+            {"label": e["label"], "score": float(e["score"])}
+            for e in emo
+        ]
+        overall = overall_emotion(emotions)
 
     # ---- overrides ----
-    if grief_override(clean):
+    if grief_override(sig):
         overall = "strong_distress"
-    elif distress_slang_override(clean):
+    elif distress_slang_override(sig):
         overall = "strong_distress"
 
-    return {
-        "language": lang,
+    result = {
+        "language": pending["lang"],
         "emotions": emotions,
         "overall": overall,
         "caps_intense": detect_caps_intensity(clean),
         "stretch_intense": detect_stretch_words(clean),
-        "bro_style": detect_bro_style(clean)
+        "bro_style": detect_bro_style(sig)
     }
+
+    if cacheable:
+        analysis_cache.set(pending["key"], copy_analysis(result))
+
+    return result
+
+
+def analyze_text(text: str, detect_lang: bool = True):
+
+    result, pending = begin_analysis(text, detect_lang)
+    if pending is None:
+        return result
+
+    emo = error = None
+    if pending["use_model"]:
+        try:
+            emo = emotion_batcher(pending["clean"])
+        except Exception as e:
+            error = e
+
+    return finish_analysis(pending, emo, error)
+
+
+# ---------------- ASYNC ENTRY ----------------
+
+# keeps CPU-bound pre-model work (signals, language detection) off the
+# event loop; nothing on this pool waits for the model
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "8"))
+
+analysis_executor = ThreadPoolExecutor(
+    max_workers=ANALYSIS_WORKERS,
+    thread_name_prefix="analysis"
+)
+
+
+async def analyze_text_async(text: str, detect_lang: bool = True):
+    arrived = time.monotonic()
+    loop = asyncio.get_running_loop()
+
+    result, pending = await loop.run_in_executor(
+        analysis_executor, begin_analysis, text, detect_lang
+    )
+    if pending is None:
+        return result
+
+    # submitted from the event loop, so the batcher queue is the one place
+    # a message waits: its bound and deadline (counted from arrival) apply
+    emo = error = None
+    if pending["use_model"]:
+        try:
+            emo = await asyncio.wrap_future(
+                emotion_batcher.submit(pending["clean"], arrived_at=arrived)
+            )
+        except Exception as e:
+            error = e
+
+    return finish_analysis(pending, emo, error)
+
+
+async def detect_language_async(text: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(analysis_executor, detect_language, text)
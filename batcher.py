@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class Overloaded(RuntimeError):
+    """Raised for items shed by admission control (queue full or stale)."""
+
+
+# ---------------- DYNAMIC MICRO-BATCHER ----------------
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item calls into one batched call of `fn`.
+
+    `fn` takes a list of items and must return a list of results in the
+    same order. A batch closes when it reaches `max_batch_size` or when
+    `max_wait_ms` has passed since its first item arrived.
+
+    Admission control: at most `workers` batches run at once, at most
+    `max_queue` items wait (0 = unbounded), and items that waited longer
+    than `max_queue_wait_ms` are dropped. Shed items fail with Overloaded.
+    """
+
+    def __init__(self, fn, max_batch_size=16, max_wait_ms=10.0, name="batcher",
+                 workers=1, max_queue=0, max_queue_wait_ms=None):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self.workers = max(1, int(workers))
+        self.max_queue_wait = None if max_queue_wait_ms is None else float(max_queue_wait_ms) / 1000.0
+
+        self._queue = queue.Queue(maxsize=max(0, int(max_queue)))
+        self._lock = threading.Lock()
+        self._threads = []
+
+        self.submitted = 0
+        self.batches = 0
+        self.items_batched = 0
+        self.shed_full = 0
+        self.shed_stale = 0
+        self.in_flight = 0
+        self._waits = deque(maxlen=1024)   # recent queue waits, seconds
+
+    # ---- worker lifecycle ----
+
+    def _ensure_worker(self):
+        # started lazily so importing the module never spawns threads
+        if len(self._threads) == self.workers and all(t.is_alive() for t in self._threads):
+            return
+
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                t = threading.Thread(
+                    target=self._run, name=f"{self.name}-{len(self._threads)}", daemon=True
+                )
+                t.start()
+                self._threads.append(t)
+
+    # ---- public API ----
+
+    def submit(self, item, arrived_at=None) -> Future:
+        """
+        Queue one item. `arrived_at` (time.monotonic()) backdates the
+        queue deadline to when the caller's request arrived.
+        """
+
+        fut = Future()
+        self._ensure_worker()
+
+        try:
+            self._queue.put_nowait((item, fut, arrived_at or time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self.shed_full += 1
+            raise Overloaded(f"{self.name}: queue full")
+
+        with self._lock:
+            self.submitted += 1
+        return fut
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def depth(self) -> int:
+        """Items waiting for a batch (approximate, like Queue.qsize)."""
+
+        return self._queue.qsize()
+
+    # ---- batching loop ----
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # window closed — still take anything already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _admit(self, collected):
+        now = time.monotonic()
+        batch = []
+
+        for item, fut, queued_at in collected:
+            if not fut.set_running_or_notify_cancel():
+                continue
+
+            waited = now - queued_at
+            stale = self.max_queue_wait is not None and waited > self.max_queue_wait
+
+            with self._lock:
+                self._waits.append(waited)
+                self.shed_stale += stale
+
+            if stale:
+                fut.set_exception(Overloaded(f"{self.name}: waited {waited * 1000:.0f}ms"))
+                continue
+
+            batch.append((item, fut))
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._admit(self._collect())
+            if not batch:
+                continue
+
+            with self._lock:
+                self.in_flight += 1
+                self.batches += 1
+                self.items_batched += len(batch)
+
+            try:
+                results = self.fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: got {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+    # ---- stats ----
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 2) if waits else 0.0
+
+        return {
+            "queue_depth": self.depth(),
+            "in_flight": self.in_flight,
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "mean_batch_size": round(self.items_batched / self.batches, 2) if self.batches else 0.0,
+            "shed_full": self.shed_full,
+            "shed_stale": self.shed_stale,
+            "wait_p50_ms": pct(0.50),
+            "wait_p95_ms": pct(0.95),
+        }
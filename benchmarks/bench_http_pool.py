@@ -0,0 +1,139 @@
+"""
+Per-call cost of fresh HTTPS connections vs the pooled keep-alive clients.
+
+Starts a local stub HTTPS server with a throwaway self-signed certificate
+(needs the `openssl` CLI) and times N GET calls each way:
+
+    python benchmarks/bench_http_pool.py --calls 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import requests
+
+import http_pool
+
+
+# ---------------- stub server ----------------
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({"extract": "stub"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_cert(tmp):
+    cert = os.path.join(tmp, "cert.pem")
+    key = os.path.join(tmp, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", key, "-out", cert, "-days", "1",
+            "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+def start_server(cert, key):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+    server.socket = ctx.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---------------- runners ----------------
+
+def timed(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def bench_sync(url, cert, calls):
+    fresh = timed(lambda: requests.get(url, verify=cert, timeout=5), calls)
+
+    session = http_pool.make_session()
+    session.get(url, verify=cert, timeout=5)   # open the pooled connection
+    pooled = timed(lambda: session.get(url, verify=cert, timeout=5), calls)
+
+    return fresh, pooled
+
+
+async def bench_async(url, cert, calls):
+
+    async def fresh_call():
+        async with httpx.AsyncClient(verify=cert) as c:
+            await c.get(url)
+
+    async def run(fn):
+        start = time.perf_counter()
+        for _ in range(calls):
+            await fn()
+        return (time.perf_counter() - start) / calls * 1000
+
+    fresh = await run(fresh_call)
+
+    # same pool settings as the shared client, trusting the stub's cert
+    pooled_client = http_pool.make_async_client(verify=cert)
+    await pooled_client.get(url)
+    pooled = await run(lambda: pooled_client.get(url))
+    await pooled_client.aclose()
+
+    return fresh, pooled
+
+
+# ---------------- main ----------------
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=100)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = make_cert(tmp)
+        server = start_server(cert, key)
+        url = f"https://127.0.0.1:{server.server_address[1]}/summary"
+
+        rows = [
+            ("requests", *bench_sync(url, cert, args.calls)),
+            ("httpx", *asyncio.run(bench_async(url, cert, args.calls))),
+        ]
+
+        server.shutdown()
+
+    print(f"{'client':<10}{'fresh ms/call':>16}{'pooled ms/call':>16}{'saved':>10}")
+    for name, fresh, pooled in rows:
+        print(f"{name:<10}{fresh:>16.2f}{pooled:>16.2f}{fresh - pooled:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+language_id.detect_language vs calling langdetect on every message.
+
+Reports per-call latency (cold cache and warm cache), how often the
+fast path answers, agreement with seeded langdetect, and how often
+unseeded langdetect changes its answer between runs:
+
+    python benchmarks/bench_language_id.py --rounds 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langdetect import DetectorFactory, detect
+
+import language_id
+
+CORPUS = [
+    "i'm so tired of everything and i don't know what to do",
+    "bro the client moved the deadline again and i'm cooked",
+    "just got the job offer, finally!! can't believe it",
+    "my dog passed away this morning and the house feels empty",
+    "who is the director of that new space movie",
+    "honestly not sure how i feel about moving to a new city",
+    "estoy muy cansado y no sé qué hacer con mi vida",
+    "je suis tellement fatigué, c'est trop pour moi",
+    "ich bin so müde und ich weiß nicht mehr weiter",
+    "estou muito cansado e não sei o que fazer",
+    "sono molto stanco e non so cosa fare",
+    "ik ben zo moe en ik weet niet wat ik moet doen",
+    "यार आज का दिन बहुत खराब था",
+    "今日はとても疲れました、もう寝たいです",
+    "오늘 정말 힘든 하루였어요",
+    "σήμερα ήταν μια πολύ δύσκολη μέρα",
+    "இன்று மிகவும் கடினமான நாள்",
+    "yaar aaj ka din bahut kharab tha honestly",
+    "ugh lol idk tbh ngl fr fr",
+]
+
+
+def timed(fn, texts, rounds):
+    samples = []
+    for _ in range(rounds):
+        for t in texts:
+            t0 = time.perf_counter()
+            fn(t)
+            samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples), max(samples)
+
+
+def langdetect_seeded(text):
+    try:
+        return detect(text)
+    except Exception:
+        return "unknown"
+
+
+def cold_language_id(text):
+    language_id.lang_cache.clear()
+    return language_id.detect_language(text)
+
+
+def unstable_share(texts, runs=5):
+    # unseeded langdetect: messages whose answer differs across runs
+    DetectorFactory.seed = None
+    unstable = 0
+    for t in texts:
+        answers = {langdetect_seeded(t) for _ in range(runs)}
+        unstable += len(answers) > 1
+    DetectorFactory.seed = 0
+    return unstable / len(texts)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=200)
+    args = ap.parse_args()
+
+    texts = [t for t in CORPUS if len(t) >= language_id.SHORT_TEXT_CHARS]
+
+    rows = [
+        ("langdetect", timed(langdetect_seeded, texts, max(1, args.rounds // 10))),
+        ("language_id cold", timed(cold_language_id, texts, args.rounds)),
+        ("language_id warm", timed(language_id.detect_language, texts, args.rounds)),
+    ]
+
+    print(f"{'path':18} {'p50 us':>10} {'max us':>10}")
+    for name, (p50, worst) in rows:
+        print(f"{name:18} {p50:10.1f} {worst:10.1f}")
+
+    language_id.lang_cache.clear()
+    agree = 0
+    print()
+    for t in texts:
+        ours, ref = language_id.detect_language(t), langdetect_seeded(t)
+        agree += ours == ref
+        if ours != ref:
+            print(f"  differs: {t[:40]!r:44} language_id={ours} langdetect={ref}")
+
+    stats = language_id.language_stats()
+    fast = stats["script"] + stats["stopwords"]
+    print(f"\nagreement with langdetect  {agree / len(texts):.0%}")
+    print(f"fast-path share            {fast / max(1, fast + stats['detector']):.0%}")
+    print(f"unseeded langdetect flips  {unstable_share(texts):.0%}")
+
+
+if __name__ == "__main__":
+    main()
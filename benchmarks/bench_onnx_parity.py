@@ -0,0 +1,130 @@
+"""
+Torch pipeline vs int8 ONNX Runtime backend for the emotion classifier.
+
+Each backend runs in its own subprocess so resident memory is measured
+cleanly. Reports top-1 label agreement, top-3 set agreement, max score
+drift, single-message p50/p99 latency and peak RSS:
+
+    pip install -r requirements-onnx.txt
+    python onnx_backend.py export
+    python benchmarks/bench_onnx_parity.py --runs 200
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CORPUS = [
+    "i'm cooked, this exam destroyed me",
+    "we cooked today, best match of the season!!",
+    "my dog passed away this morning",
+    "just got the job offer, finally",
+    "i'm so tired of everything",
+    "who is the director of interstellar",
+    "bro the client moved the deadline again",
+    "i think i'm going to cry",
+    "that movie was actually kind of scary",
+    "ugh my roommate ate my food again",
+    "I DID IT I PASSED",
+    "not sure how i feel about the move tbh",
+    "hi",
+    "i broke my arm skating lol",
+    "everything feels heavy lately and i don't know why",
+    "this is so disgusting, who leaves trash like that",
+]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_backend(backend, runs):
+    os.environ["EMOTION_BACKEND"] = backend
+    import analyzer
+
+    pipe = analyzer.load_emotion_model()
+    pipe(["warm up"], truncation=True)
+
+    labels = [analyzer._as_label_list(r) for r in pipe(CORPUS, batch_size=len(CORPUS), truncation=True)]
+
+    latencies = []
+    for i in range(runs):
+        text = CORPUS[i % len(CORPUS)]
+        t0 = time.perf_counter()
+        pipe([text], truncation=True)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    # ru_maxrss is KiB on Linux
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return {
+        "backend": backend,
+        "labels": labels,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "rss_mb": round(rss_mb, 1),
+    }
+
+
+def spawn(backend, runs):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", backend, "--runs", str(runs)],
+        capture_output=True, text=True, check=True, cwd=ROOT
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(ref, cand):
+    top1 = top3 = 0
+    drift = 0.0
+
+    for a, b in zip(ref["labels"], cand["labels"]):
+        top1 += a[0]["label"] == b[0]["label"]
+        top3 += {x["label"] for x in a} == {x["label"] for x in b}
+
+        scores = {x["label"]: x["score"] for x in b}
+        for x in a:
+            if x["label"] in scores:
+                drift = max(drift, abs(x["score"] - scores[x["label"]]))
+
+    n = len(ref["labels"])
+    return {"top1_agreement": top1 / n, "top3_agreement": top3 / n, "max_score_drift": round(drift, 4)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--worker", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.runs)))
+        return
+
+    torch_res = spawn("torch", args.runs)
+    onnx_res = spawn("onnx", args.runs)
+
+    print(f"{'backend':8} {'p50 ms':>8} {'p99 ms':>8} {'rss MB':>8}")
+    for r in (torch_res, onnx_res):
+        print(f"{r['backend']:8} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} {r['rss_mb']:8.1f}")
+
+    parity = compare(torch_res, onnx_res)
+    print(f"\ntop-1 agreement  {parity['top1_agreement']:.1%}")
+    print(f"top-3 agreement  {parity['top3_agreement']:.1%}")
+    print(f"max score drift  {parity['max_score_drift']}")
+
+    for a, b, text in zip(torch_res["labels"], onnx_res["labels"], CORPUS):
+        if a[0]["label"] != b[0]["label"]:
+            print(f"  differs: {text!r}  torch={a[0]['label']} onnx={b[0]['label']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Throughput of each memory.py storage backend.
+
+Runs the per-turn pattern from /chat — append one message, read the
+recent window, summary state and turn count — from several threads:
+
+    python benchmarks/bench_session_store.py --ops 20000 --threads 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import InMemoryStore, SQLiteStore, Message
+
+
+def record(i):
+    return Message("user", f"message number {i} about my day")
+
+
+def run(store, ops, threads, sessions):
+    per_thread = ops // threads
+
+    def worker(tid):
+        for i in range(per_thread):
+            sid = f"s{(tid * per_thread + i) % sessions}"
+            store.append(sid, record(i))
+            store.recent(sid, 6)
+            store.summary_state(sid)
+            store.turn_count(sid)
+
+    start = time.perf_counter()
+    ts = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    store.flush()
+    elapsed = time.perf_counter() - start
+
+    return per_thread * threads / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ops", type=int, default=20000)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--sessions", type=int, default=500)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            ("memory", InMemoryStore()),
+            ("sqlite", SQLiteStore(os.path.join(tmp, "sessions.db"))),
+        ]
+
+        print(f"{'backend':<10}{'turns/sec':>12}")
+        for name, store in backends:
+            rate = run(store, args.ops, args.threads, args.sessions)
+            print(f"{name:<10}{rate:>12.0f}")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Checks the LLM rate-limit scheduler against a stub that enforces limits.
+
+The stub admits at most --rpm requests and --tpm tokens per --window-s
+seconds (sliding window), sends Groq's x-ratelimit-* headers on every
+response and answers 429 with Retry-After once a budget is spent. A burst
+of user replies and background summaries is then sent through llm_client:
+
+    python benchmarks/check_rate_limits.py
+    python benchmarks/check_rate_limits.py --replies 40 --background 10 --rpm 12
+
+Two runs: "matched" configures the scheduler with the stub's limits; it
+must see no 429s, and no queued background call may go ahead of a user
+reply.
+"headers" starts with no local limits, learns them from the headers and
+Retry-After, and must still answer every request.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import LLMStub
+
+REPLY_PROMPTS = [
+    "i'm so tired of everything and i don't know what to do anymore",
+    "just got the job offer, finally!! can't believe it",
+    "not sure how i feel about moving to a new city",
+    "ugh my roommate ate my food again, so frustrated",
+]
+
+SUMMARY_PROMPT = (
+    "Update this conversation summary with the new turns below.\n"
+    "Summary so far:\nUser is stressed about work.\n"
+    "New turns:\nuser: the client moved the deadline again | bot: that sounds exhausting"
+)
+
+
+# ---------------- LIMITED STUB ----------------
+
+def reset_header(seconds: float) -> str:
+    # Groq style: "7.66s", "2m59.56s"
+    minutes, rest = divmod(max(0.0, seconds), 60)
+    return f"{int(minutes)}m{rest:.2f}s" if minutes else f"{rest:.2f}s"
+
+
+class LimitedLLMStub(LLMStub):
+    """
+    LLMStub with request and token budgets, refilled continuously over the
+    window the way Groq's are: x-ratelimit-reset-* is the time until the
+    budget is full again.
+    """
+
+    def __init__(self, rpm, tpm, window_s, **kwargs):
+        super().__init__(**kwargs)
+        self.limits = {"requests": float(rpm), "tokens": float(tpm)}
+        self.levels = dict(self.limits)
+        self.window_s = window_s
+        self.updated = time.monotonic()
+        self.admit_lock = threading.Lock()
+
+    def cost(self, body) -> int:
+        # the same accounting the stub reports back as usage
+        prompt = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        return prompt + len(self.reply.split(" "))
+
+    def admit(self, body):
+        need = {"requests": 1, "tokens": self.cost(body)}
+
+        with self.admit_lock:
+            now = time.monotonic()
+            for kind, limit in self.limits.items():
+                rate = limit / self.window_s
+                self.levels[kind] = min(limit, self.levels[kind] + (now - self.updated) * rate)
+            self.updated = now
+
+            ok = all(self.levels[k] >= n for k, n in need.items())
+            if ok:
+                for k, n in need.items():
+                    self.levels[k] -= n
+
+            headers = {}
+            for kind, limit in self.limits.items():
+                rate = limit / self.window_s
+                headers[f"x-ratelimit-limit-{kind}"] = str(int(limit))
+                headers[f"x-ratelimit-remaining-{kind}"] = str(int(self.levels[kind]))
+                headers[f"x-ratelimit-reset-{kind}"] = reset_header((limit - self.levels[kind]) / rate)
+
+            if ok:
+                return 200, headers
+
+            wait = max(
+                (n - self.levels[k]) / (self.limits[k] / self.window_s) for k, n in need.items()
+            )
+            headers["retry-after"] = str(max(1, math.ceil(wait)))
+            return 429, headers
+
+
+# ---------------- RUN ----------------
+
+def run(args, llm_client, limiter, label):
+    from rate_limiter import PRIORITY_BACKGROUND
+
+    llm_client.llm_limiter = limiter
+    done = {"reply": [], "background": []}   # seconds from start
+    failed = {"reply": 0, "background": 0}
+
+    async def reply(i, t0):
+        text = await llm_client.ask_llm_async(REPLY_PROMPTS[i % len(REPLY_PROMPTS)])
+        if llm_client.is_error_reply(text):
+            failed["reply"] += 1
+        done["reply"].append(time.perf_counter() - t0)
+
+    async def background(t0):
+        text = await asyncio.to_thread(llm_client.ask_llm, SUMMARY_PROMPT, PRIORITY_BACKGROUND)
+        if llm_client.is_error_reply(text):
+            failed["background"] += 1
+        done["background"].append(time.perf_counter() - t0)
+
+    async def burst():
+        t0 = time.perf_counter()
+        # background work starts first and takes the idle budget; replies
+        # arriving later must overtake whatever is still queued
+        tasks = [asyncio.ensure_future(background(t0)) for _ in range(args.background)]
+        await asyncio.sleep(0.5)
+
+        in_flight = limiter.stats()["granted"]["background"]
+        tasks += [reply(i, t0) for i in range(args.replies)]
+        await asyncio.gather(*tasks)
+
+        last_reply = max(done["reply"])
+        overtook = sum(1 for t in done["background"] if t < last_reply) - in_flight
+        return time.perf_counter() - t0, max(0, overtook)
+
+    stub = LimitedLLMStub(
+        args.rpm, args.tpm, args.window_s,
+        latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 5, token_delay_ms=0
+    )
+    llm_client.URL = stub.start()
+
+    elapsed, overtook = asyncio.run(burst())
+    stub.stop()
+
+    def mean(xs):
+        return sum(xs) / len(xs) if xs else 0.0
+
+    result = {
+        "elapsed_s": round(elapsed, 2),
+        "upstream_requests": stub.stats.get("requests", 0),
+        "upstream_429": stub.stats.get("status_429", 0),
+        "failed": failed,
+        "reply_mean_done_s": round(mean(done["reply"]), 2),
+        "background_mean_done_s": round(mean(done["background"]), 2),
+        "background_overtook": overtook,
+        "limiter": limiter.stats(),
+    }
+
+    print(f"\n[{label}] {args.replies} replies + {args.background} background in {result['elapsed_s']}s")
+    for k, v in result.items():
+        if k != "elapsed_s":
+            print(f"  {k:24} {v}")
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--replies", type=int, default=24)
+    ap.add_argument("--background", type=int, default=6)
+    ap.add_argument("--rpm", type=int, default=10, help="requests per window")
+    ap.add_argument("--tpm", type=int, default=800, help="tokens per window")
+    ap.add_argument("--window-s", type=float, default=5.0)
+    ap.add_argument("--latency-ms", type=float, default=50)
+    args = ap.parse_args()
+
+    # limits and deadlines are read at import time
+    os.environ["LLM_RPM"] = str(args.rpm)
+    os.environ["LLM_TPM"] = str(args.tpm)
+    os.environ["LLM_RATE_WINDOW_S"] = str(args.window_s)
+    os.environ.setdefault("LLM_DEADLINE_S", "30")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+
+    import llm_client
+    from rate_limiter import RateLimitScheduler
+
+    problems = []
+
+    matched = run(args, llm_client, llm_client.llm_limiter, "matched")
+    if matched["upstream_429"]:
+        problems.append(f"matched: {matched['upstream_429']} upstream 429s")
+
+    headers = run(args, llm_client, RateLimitScheduler(0, 0, name="headers"), "headers")
+
+    if matched["background_overtook"]:
+        problems.append(f"matched: {matched['background_overtook']} background calls overtook queued replies")
+
+    for label, r in (("matched", matched), ("headers", headers)):
+        if r["failed"]["reply"] or r["failed"]["background"]:
+            problems.append(f"{label}: failed requests {r['failed']}")
+
+    if problems:
+        print("\nFAILED\n  " + "\n  ".join(problems))
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
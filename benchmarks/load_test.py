@@ -0,0 +1,366 @@
+"""
+End-to-end load test of main.app against local Groq and Wikipedia stubs.
+
+Drives /chat (and optionally /chat/stream) in-process with a message mix
+and a fixed concurrency, times every stage of the turn, and writes the
+results as JSON. A 200 whose reply is a fallback, glitch or upstream
+error counts as a failure. Compare against a previous run to catch
+latency or failure-rate regressions:
+
+    python benchmarks/load_test.py --requests 500 --concurrency 16 \\
+        --out load.json --baseline load-previous.json
+
+The emotion model is replaced by a fixed-latency stand-in unless
+--model real is given.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import LLMStub, WikiStub
+
+# ---------------- MESSAGE MIX ----------------
+
+MESSAGES = {
+    "greeting": [
+        "hi", "hey", "hello there", "yo", "bye", "good night",
+    ],
+    "grief": [
+        "my dog passed away this morning and i can't stop crying",
+        "my grandma died last week and the funeral is tomorrow",
+        "i lost my best friend in an accident, it doesn't feel real",
+    ],
+    "vent": [
+        ("i'm so tired of everything. work has been relentless, the client keeps "
+         "moving the deadline and my manager acts like it's my fault. ") * 12,
+        ("honestly i don't even know where to start, my roommate moved out, rent went "
+         "up, i failed the exam i studied for all month and i feel cooked. ") * 10,
+    ],
+    "knowledge": [
+        "who is christopher nolan",
+        "what is interstellar",
+        "tell me about the song bohemian rhapsody",
+        "who is the director of oppenheimer",
+    ],
+    "chat": [
+        "bro we cooked today, best match of the season",
+        "just got the job offer, finally!!",
+        "not sure how i feel about moving to a new city",
+        "ugh my roommate ate my food again",
+    ],
+}
+
+DEFAULT_MIX = "greeting=3,grief=1,vent=1,knowledge=2,chat=3"
+
+
+def parse_mix(spec: str):
+    kinds, weights = [], []
+    for part in spec.split(","):
+        name, _, w = part.partition("=")
+        if name not in MESSAGES:
+            sys.exit(f"unknown message kind {name!r}; choose from {', '.join(MESSAGES)}")
+        kinds.append(name)
+        weights.append(float(w or 1))
+    return kinds, weights
+
+
+# ---------------- STAGE TIMING ----------------
+
+timings = defaultdict(list)   # stage -> [ms]
+
+
+def timed_async(name, fn):
+    async def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            timings[name].append((time.perf_counter() - t0) * 1000)
+    return wrapper
+
+
+def timed_sync(name, fn):
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timings[name].append((time.perf_counter() - t0) * 1000)
+    return wrapper
+
+
+def timed_stream(name, fn):
+    async def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        first = True
+        try:
+            async for chunk in fn(*args, **kwargs):
+                if first:
+                    timings[name + "_first_token"].append((time.perf_counter() - t0) * 1000)
+                    first = False
+                yield chunk
+        finally:
+            timings[name].append((time.perf_counter() - t0) * 1000)
+    return wrapper
+
+
+def instrument(main, summary_worker):
+    main.analyze_text_async = timed_async("analysis", main.analyze_text_async)
+    main.detect_language_async = timed_async("language", main.detect_language_async)
+    main.web_search_async = timed_async("search", main.web_search_async)
+    main.build_prompt = timed_sync("prompt", main.build_prompt)
+    main.ask_llm_async = timed_async("llm", main.ask_llm_async)
+    main.stream_reply = timed_stream("llm_stream", main.stream_reply)
+    summary_worker.build_incremental_summary = timed_sync(
+        "summary", summary_worker.build_incremental_summary
+    )
+
+
+# ---------------- MODEL STAND-IN ----------------
+
+class StubEmotionModel:
+    """Fixed per-batch plus per-item latency, plausible top-3 labels."""
+
+    LABELS = ["sadness", "joy", "fear", "anger", "neutral", "surprise", "disgust"]
+    tokenizer = None
+
+    def __init__(self, batch_ms, item_ms):
+        self.batch_ms = batch_ms
+        self.item_ms = item_ms
+
+    def __call__(self, texts, **kwargs):
+        time.sleep((self.batch_ms + self.item_ms * len(texts)) / 1000.0)
+        out = []
+        for t in texts:
+            rng = random.Random(t)
+            labels = rng.sample(self.LABELS, 3)
+            out.append([
+                {"label": labels[0], "score": 0.7},
+                {"label": labels[1], "score": 0.2},
+                {"label": labels[2], "score": 0.1},
+            ])
+        return out
+
+
+# ---------------- DRIVER ----------------
+
+async def drive(app, args, kinds, weights):
+    import httpx
+    from llm_client import is_error_reply
+
+    rng = random.Random(args.seed)
+    statuses = defaultdict(int)
+    outcomes = defaultdict(int)   # ok / http_error / error_reply
+    remaining = args.requests
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+
+        async def one():
+            kind = rng.choices(kinds, weights)[0]
+            text = rng.choice(MESSAGES[kind])
+            body = {"anon_userid": f"user-{rng.randrange(args.users)}", "text": text}
+            stream = rng.random() < args.stream_share
+
+            t0 = time.perf_counter()
+            reply = None
+            if stream:
+                async with client.stream("POST", "/chat/stream", json=body) as r:
+                    first, event = None, None
+                    async for line in r.aiter_lines():
+                        if first is None and line.startswith("data:"):
+                            first = time.perf_counter()
+                            timings["stream_first_byte"].append((first - t0) * 1000)
+                        if line.startswith("event:"):
+                            event = line[6:].strip()
+                        elif event == "done" and line.startswith("data:"):
+                            reply = json.loads(line[5:]).get("reply")
+                    status = r.status_code
+            else:
+                r = await client.post("/chat", json=body)
+                status = r.status_code
+                if status == 200:
+                    reply = r.json().get("reply")
+
+            ms = (time.perf_counter() - t0) * 1000
+            statuses[status] += 1
+
+            # a 200 carrying a fallback, glitch or upstream error is a failure
+            if status != 200:
+                outcomes["http_error"] += 1
+            elif reply is None or is_error_reply(reply):
+                outcomes["error_reply"] += 1
+            else:
+                outcomes["ok"] += 1
+            timings["request"].append(ms)
+            timings[f"request_{kind}"].append(ms)
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await one()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+
+    return elapsed, dict(statuses), dict(outcomes)
+
+
+# ---------------- REPORT ----------------
+
+def summarize(samples):
+    s = sorted(samples)
+
+    def pct(p):
+        return round(s[min(len(s) - 1, int(len(s) * p / 100))], 2)
+
+    return {
+        "count": len(s),
+        "mean_ms": round(sum(s) / len(s), 2),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(s[-1], 2),
+    }
+
+
+def compare(result, baseline, max_regress, max_failure_increase):
+    regressions = []
+
+    before = baseline.get("failure_rate")
+    now = result["failure_rate"]
+    if before is not None:
+        flag = "  <-- regression" if now - before > max_failure_increase else ""
+        print(f"\n{'failure rate':26} {before:10.1%} {now:10.1%}{flag}")
+        if flag:
+            regressions.append("failure_rate")
+    print(f"\n{'stage':26} {'base p95':>10} {'now p95':>10} {'change':>8}")
+
+    for stage, now in sorted(result["stages"].items()):
+        before = baseline.get("stages", {}).get(stage)
+        if not before or not before["p95_ms"]:
+            continue
+
+        change = now["p95_ms"] / before["p95_ms"] - 1
+        # sub-millisecond stages jitter by more than any sane threshold
+        slower = change > max_regress and now["p95_ms"] - before["p95_ms"] > 1.0
+        flag = "  <-- regression" if slower else ""
+        print(f"{stage:26} {before['p95_ms']:10.1f} {now['p95_ms']:10.1f} {change:+8.0%}{flag}")
+        if flag:
+            regressions.append(stage)
+
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--mix", default=DEFAULT_MIX)
+    ap.add_argument("--stream-share", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=7)
+
+    ap.add_argument("--llm-latency-ms", type=float, default=300)
+    ap.add_argument("--llm-jitter-ms", type=float, default=50)
+    ap.add_argument("--llm-token-ms", type=float, default=10)
+    ap.add_argument("--llm-error-rate", type=float, default=0.0)
+    ap.add_argument("--llm-error-status", type=int, default=500)
+    ap.add_argument("--llm-rpm", type=float, default=0,
+                    help="client-side LLM_RPM; 0 leaves the rate limiter unpaced")
+    ap.add_argument("--llm-tpm", type=float, default=0, help="client-side LLM_TPM")
+    ap.add_argument("--wiki-latency-ms", type=float, default=80)
+    ap.add_argument("--wiki-miss-rate", type=float, default=0.2)
+
+    ap.add_argument("--model", choices=["stub", "real"], default="stub")
+    ap.add_argument("--model-batch-ms", type=float, default=15)
+    ap.add_argument("--model-item-ms", type=float, default=3)
+
+    ap.add_argument("--out", default="load_results.json")
+    ap.add_argument("--baseline", help="previous results file to compare p95s against")
+    ap.add_argument("--max-regress", type=float, default=0.2)
+    ap.add_argument("--max-failure-increase", type=float, default=0.01,
+                    help="allowed rise in failure rate vs baseline, absolute")
+    args = ap.parse_args()
+
+    kinds, weights = parse_mix(args.mix)
+
+    llm = LLMStub(
+        latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+        token_delay_ms=args.llm_token_ms,
+        error_rate=args.llm_error_rate, error_status=args.llm_error_status
+    )
+    wiki = WikiStub(latency_ms=args.wiki_latency_ms, miss_rate=args.wiki_miss_rate)
+
+    # endpoints and rate limits are read at import time; the stub sends no
+    # rate-limit headers, so unless asked the limiter never paces calls
+    os.environ["LLM_API_URL"] = llm.start()
+    os.environ["WIKI_SUMMARY_URL"] = wiki.start()
+    os.environ["LLM_RPM"] = str(args.llm_rpm)
+    os.environ["LLM_TPM"] = str(args.llm_tpm)
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+
+    import analyzer
+    import main as app_main
+    import summary_worker
+
+    if args.model == "stub":
+        model = StubEmotionModel(args.model_batch_ms, args.model_item_ms)
+        analyzer.load_emotion_model = lambda: model
+
+    analyzer.warm_up()
+    instrument(app_main, summary_worker)
+
+    elapsed, statuses, outcomes = asyncio.run(drive(app_main.app, args, kinds, weights))
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "statuses": statuses,
+        "outcomes": outcomes,
+        "failure_rate": round(1 - outcomes.get("ok", 0) / args.requests, 4),
+        "stages": {name: summarize(v) for name, v in sorted(timings.items()) if v},
+        "stubs": {"llm": llm.stats, "wiki": wiki.stats},
+        "service": {
+            "inference": analyzer.inference_stats(),
+            "search_cache": app_main.search_stats(),
+        },
+    }
+
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{args.requests} requests in {elapsed:.2f}s — {result['throughput_rps']} req/s, statuses {statuses}")
+    print(f"outcomes {outcomes}, failure rate {result['failure_rate']:.1%}")
+    print(f"\n{'stage':26} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, s in result["stages"].items():
+        print(f"{name:26} {s['count']:6d} {s['p50_ms']:8.1f} {s['p95_ms']:8.1f} {s['p99_ms']:8.1f}")
+    print(f"\nwrote {args.out}")
+
+    llm.stop()
+    wiki.stop()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.max_regress, args.max_failure_increase)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Microbenchmarks for the pure-Python per-request hot path.
+
+Times each function over a corpus of chat messages (median of
+interleaved rounds, microseconds per call), plus the whole no-network
+pipeline with the emotion model stubbed. Results are compared with a
+stored baseline and the run fails when a case is slower than the
+threshold allows and by more than an absolute floor:
+
+    python benchmarks/microbench.py                    # compare
+    python benchmarks/microbench.py --update-baseline  # record
+    python benchmarks/microbench.py --threshold 0.15 --only build_prompt
+
+Baselines are machine-specific; record them on the machine that gates.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "microbench_baseline.json")
+
+CORPUS = [
+    "hi",
+    "hey",
+    "bye",
+    "good night",
+    "who are you",
+    "what can you do",
+    "i'm so tired of everything and i don't know what to do anymore",
+    "bro the client moved the deadline again, i'm cooked",
+    "we cooked today, best match of the season!!",
+    "just got the job offer, finally!! can't believe it",
+    "I DID IT I PASSED THE EXAM",
+    "WHY IS THIS HAPPENING TO ME",
+    "noooooo my phone fell in the water",
+    "yaaaay we won the finals",
+    "my dog passed away this morning and the house feels empty",
+    "my grandma died last week, the funeral is tomorrow",
+    "i broke my arm skating lol it hurts so much",
+    "i think i'm about to cry honestly",
+    "the stakeholder escalation went badly and the project is not on track",
+    "which one should i buy, the blue shirt or the black dress",
+    "who is christopher nolan",
+    "tell me about the song bohemian rhapsody",
+    "what is interstellar",
+    "not sure how i feel about moving to a new city",
+    "ugh my roommate ate my food again, so frustrated",
+    "feeling low and overwhelmed today, nothing is going right",
+    "dude that movie was actually kind of scary",
+    "i give up, this is too much for me",
+    "honestly i'm not okay",
+    "lets go i finally got the internship",
+    ("i'm so tired of everything. work has been relentless, the client keeps "
+     "moving the deadline and my manager acts like it's my fault. ") * 6,
+    ("honestly i don't even know where to start, my roommate moved out, rent "
+     "went up and i failed the exam i studied for all month. ") * 5,
+]
+
+MEMORY = (
+    "user: hey | bot: hey, how's your day going? | user: kinda rough honestly | "
+    "bot: what happened? | user: work stuff, the usual | bot: want to talk it through?"
+)
+SUMMARY = "User has been stressed about work deadlines and a difficult manager."
+SEARCH = "Christopher Nolan is a British-American filmmaker known for Inception and Interstellar."
+
+REPLY = (
+    "That sounds like a lot to carry. I'm here with you. What part of it is "
+    "sitting heaviest right now? We can take it one piece at a time. "
+    "You don't have to figure it all out tonight. Tell me more when you can."
+)
+
+
+# ---------------- MODEL STUB ----------------
+
+class StubEmotionModel:
+    """Instant, deterministic top-3 labels so only Python code is timed."""
+
+    tokenizer = None
+
+    def __call__(self, texts, **kwargs):
+        return [
+            [
+                {"label": "sadness", "score": 0.81},
+                {"label": "fear", "score": 0.11},
+                {"label": "joy", "score": 0.04},
+            ]
+            for _ in texts
+        ]
+
+
+# ---------------- CASES ----------------
+
+def build_cases():
+    import analyzer
+    import prompt_builder
+    from language_id import lang_cache
+    from reply_filter import limit_sentences
+    from search_client import clean_query
+    from search_trigger import should_web_search
+    from signals import compute_signals, extract_signals, signal_cache
+
+    # model stubbed and called directly, without the batching window
+    analyzer.emotion_pipe = StubEmotionModel()
+    analyzer.model_state = "ready"
+    analyzer.emotion_batcher = lambda text: analyzer.classify_batch([text])[0]
+
+    signals = [extract_signals(t) for t in CORPUS]
+    analyses = [analyzer.analyze_text(t) for t in CORPUS]
+
+    def routers(sig):
+        prompt_builder.detect_identity_question(sig)
+        prompt_builder.detect_shopping_or_lifestyle(sig)
+        prompt_builder.detect_grief(sig)
+        prompt_builder.detect_injury(sig)
+        prompt_builder.detect_crying(sig)
+        prompt_builder.detect_goodbye(sig)
+        prompt_builder.detect_distress_hint(sig)
+        prompt_builder.detect_celebration(sig)
+        prompt_builder.detect_professional_stress(sig)
+
+    def style(text, sig):
+        analyzer.detect_caps_intensity(text)
+        analyzer.detect_stretch_words(text)
+        analyzer.detect_bro_style(sig)
+
+    def pipeline(text):
+        # every message new: no signal, analysis or language cache hits
+        signal_cache.clear()
+        analyzer.analysis_cache.clear()
+        lang_cache.clear()
+
+        sig = extract_signals(text)
+        analysis = analyzer.analyze_text(text)
+        search = SEARCH if should_web_search(sig) else ""
+        if search:
+            clean_query(text)
+        prompt = prompt_builder.build_prompt(text, analysis, MEMORY, SUMMARY, search, signals=sig)
+        str(prompt)
+        return limit_sentences(REPLY, sig)
+
+    pairs = list(zip(CORPUS, signals))
+    triples = list(zip(CORPUS, signals, analyses))
+
+    return {
+        "extract_signals": (lambda: [compute_signals(t) for t in CORPUS]),
+        "detect_routers": (lambda: [routers(s) for s in signals]),
+        "route_message": (lambda: [prompt_builder.route_message(s, a["overall"]) for _, s, a in triples]),
+        "style_detectors": (lambda: [style(t, s) for t, s in pairs]),
+        "detect_caps_intensity": (lambda: [analyzer.detect_caps_intensity(t) for t in CORPUS]),
+        "clean_query": (lambda: [clean_query(t) for t in CORPUS]),
+        "should_web_search": (lambda: [should_web_search(s) for s in signals]),
+        "build_prompt": (lambda: [
+            prompt_builder.build_prompt(t, a, MEMORY, SUMMARY, SEARCH, signals=s) for t, s, a in triples
+        ]),
+        "limit_sentences": (lambda: [limit_sentences(REPLY, s) for s in signals]),
+        "pipeline": (lambda: [pipeline(t) for t in CORPUS]),
+    }
+
+
+# ---------------- TIMING ----------------
+
+def calibrate(run, min_round_s):
+    # loops per round, so a round is long enough to time reliably
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        if time.perf_counter() - t0 >= min_round_s:
+            return loops
+        loops *= 2
+
+
+def measure_all(cases, rounds, min_round_s):
+    """
+    Median microseconds per message for every case. Rounds are
+    interleaved across cases, so a slow stretch on the machine hits all
+    of them instead of one.
+    """
+
+    loops = {name: calibrate(run, min_round_s) for name, run in cases.items()}
+    samples = {name: [] for name in cases}
+
+    for _ in range(rounds):
+        for name, run in cases.items():
+            t0 = time.perf_counter()
+            for _ in range(loops[name]):
+                run()
+            samples[name].append((time.perf_counter() - t0) / loops[name] / len(CORPUS) * 1e6)
+
+    return {name: statistics.median(s) for name, s in samples.items()}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=15)
+    ap.add_argument("--min-round-ms", type=float, default=50)
+    ap.add_argument("--threshold", type=float, default=0.25,
+                    help="allowed slowdown vs baseline, as a fraction")
+    ap.add_argument("--floor-us", type=float, default=1.0,
+                    help="slowdowns smaller than this (us/msg) never fail; "
+                         "few-microsecond cases jitter by more than the threshold")
+    ap.add_argument("--only", nargs="*", help="case names to run")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args()
+
+    cases = build_cases()
+    names = args.only or list(cases)
+
+    unknown = [n for n in names if n not in cases]
+    if unknown:
+        sys.exit(f"unknown case(s) {', '.join(unknown)}; choose from {', '.join(cases)}")
+
+    timed = measure_all({n: cases[n] for n in names}, args.rounds, args.min_round_ms / 1000)
+    results = {n: round(us, 3) for n, us in timed.items()}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    failed = []
+    print(f"{'case':24} {'us/msg':>10} {'baseline':>10} {'change':>8}")
+    for name, us in results.items():
+        base = baseline.get(name)
+        if base:
+            change = us / base - 1
+            slower = change > args.threshold and us - base > args.floor_us
+            flag = "  <-- regression" if slower else ""
+            print(f"{name:24} {us:10.2f} {base:10.2f} {change:+8.0%}{flag}")
+            if flag:
+                failed.append(name)
+        else:
+            print(f"{name:24} {us:10.2f} {'-':>10}")
+
+    if args.update_baseline:
+        merged = {**baseline, **results}
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "corpus_size": len(CORPUS),
+                "results": merged,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return
+
+    if failed:
+        print(f"\n{len(failed)} case(s) slower than baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Local stand-ins for the upstream APIs, for benchmarks and checks.
+
+LLMStub speaks the OpenAI chat-completions protocol (JSON and streaming
+SSE) with configurable latency, jitter and error rate. WikiStub serves
+REST summary responses. Both run on 127.0.0.1 in a background thread:
+
+    llm = LLMStub(latency_ms=300).start()      # -> chat-completions URL
+    wiki = WikiStub(miss_rate=0.2).start()     # -> summary base URL
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = (
+    "That sounds like a lot to carry. I'm here with you. "
+    "What part of it is sitting heaviest right now? "
+    "We can take it one piece at a time."
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    stub = None   # set per server
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.stub.count("closed_early")
+
+    def send_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class _StubServer:
+
+    def __init__(self):
+        self.server = None
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def delay(self, latency_ms, jitter_ms):
+        time.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0)
+
+    def serve(self, path="/"):
+        handler = type(type(self).__name__ + "Handler", (self.handler,), {"stub": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+# ---------------- CHAT COMPLETIONS ----------------
+
+class _LLMHandler(_Handler):
+
+    def do_POST(self):
+        stub = self.stub
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        stub.count("requests")
+
+        status, headers = stub.admit(body)
+        if status != 200:
+            stub.count(f"status_{status}")
+            stub.delay(stub.latency_ms / 4, 0)
+            return self.send_json(status, {"error": {"message": "stub error"}}, headers)
+
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        words = stub.reply.split(" ")
+
+        if body.get("stream"):
+            stub.count("streams")
+            stub.delay(stub.latency_ms, stub.jitter_ms)   # time to first token
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+
+            try:
+                for i, w in enumerate(words):
+                    delta = {"choices": [{"delta": {"content": w if i == 0 else " " + w}}]}
+                    self.send_chunk(b"data: " + json.dumps(delta).encode() + b"\n\n")
+                    time.sleep(stub.token_delay_ms / 1000.0)
+                self.send_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                stub.count("closed_early")
+            return
+
+        stub.delay(stub.latency_ms + stub.token_delay_ms * len(words), stub.jitter_ms)
+        self.send_json(200, {
+            "choices": [{"message": {"role": "assistant", "content": stub.reply}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words),
+            },
+        }, headers)
+
+
+class LLMStub(_StubServer):
+    handler = _LLMHandler
+
+    def __init__(self, latency_ms=300, jitter_ms=50, error_rate=0.0, error_status=500,
+                 token_delay_ms=15, reply=REPLY):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_delay_ms = token_delay_ms
+        self.reply = reply
+
+    def admit(self, body):
+        """(status, extra headers) for one request; override for rate limits."""
+
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status, ({"retry-after": "1"} if self.error_status == 429 else {})
+        return 200, {}
+
+    def start(self) -> str:
+        return self.serve("/v1/chat/completions")
+
+
+# ---------------- WIKIPEDIA SUMMARY ----------------
+
+class _WikiHandler(_Handler):
+
+    def do_GET(self):
+        stub = self.stub
+        title = self.path.rsplit("/", 1)[-1]
+        stub.count("requests")
+        stub.delay(stub.latency_ms, stub.jitter_ms)
+
+        # stable per title, so caching behaves like the real API
+        if (zlib.crc32(title.encode()) % 1000) / 1000.0 < stub.miss_rate:
+            stub.count("misses")
+            return self.send_json(404, {"title": "Not found."})
+
+        stub.count("hits")
+        self.send_json(200, {
+            "title": title.replace("_", " "),
+            "extract": f"{title.replace('_', ' ').title()} is a subject with a short summary "
+                       f"used by the benchmark stub. It has a few sentences of context.",
+        })
+
+
+class WikiStub(_StubServer):
+    handler = _WikiHandler
+
+    def __init__(self, latency_ms=80, jitter_ms=20, miss_rate=0.2):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.miss_rate = miss_rate
+
+    def start(self) -> str:
+        return self.serve("/api/rest_v1/page/summary/")
@@ -0,0 +1,50 @@
+"""
+Per-process memory of a running gunicorn master and its workers (Linux).
+
+Pss splits shared pages between the processes that map them, so with
+the model preloaded each extra worker should add little Private memory:
+
+    gunicorn main:app -c gunicorn.conf.py &
+    python benchmarks/worker_memory.py <master pid>
+"""
+
+import sys
+
+
+def rollup(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return fields
+
+
+def children(pid):
+    path = f"/proc/{pid}/task/{pid}/children"
+    with open(path) as f:
+        return [int(p) for p in f.read().split()]
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit("usage: python benchmarks/worker_memory.py <master pid>")
+
+    master = int(sys.argv[1])
+    procs = [("master", master)] + [("worker", p) for p in children(master)]
+
+    print(f"{'process':8} {'pid':>8} {'rss MB':>9} {'pss MB':>9} {'private MB':>11} {'shared MB':>10}")
+    total_pss = 0.0
+    for role, pid in procs:
+        m = rollup(pid)
+        private = m.get("Private_Clean", 0) + m.get("Private_Dirty", 0)
+        shared = m.get("Shared_Clean", 0) + m.get("Shared_Dirty", 0)
+        total_pss += m.get("Pss", 0)
+        print(f"{role:8} {pid:8d} {m.get('Rss', 0):9.1f} {m.get('Pss', 0):9.1f} {private:11.1f} {shared:10.1f}")
+
+    print(f"\ntotal pss {total_pss:.1f} MB across {len(procs)} processes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+# ---------------- BOUNDED LRU / TTL CACHE ----------------
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional per-entry TTL and a byte budget.
+
+    `ttl` is the default lifetime in seconds (None = no expiry) and can be
+    overridden per `set`. When `max_bytes` is given, `sizeof(value)` is
+    used to account each entry and the oldest entries are evicted until
+    the cache fits.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, max_bytes=None, sizeof=None, name="cache"):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.name = name
+
+        self._data = OrderedDict()   # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=MISSING):
+        ttl = self.ttl if ttl is MISSING else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        size = self.sizeof(value) if self.sizeof else 0
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+
+            self._data[key] = (value, expires_at, size)
+            self.bytes += size
+
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
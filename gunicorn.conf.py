@@ -0,0 +1,42 @@
+"""
+Multi-worker serving with one shared copy of the emotion model.
+
+The app is imported and the model weights loaded once in the gunicorn
+master (preload_app). Workers are forked from it, so the weights stay
+shared copy-on-write; each worker only runs its own warm-up pass.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Sessions must live in a shared store when running more than one worker
+(SESSION_STORE=sqlite).
+"""
+
+import gc
+import os
+
+bind = "0.0.0.0:" + os.getenv("PORT", "10000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT_S", "120"))
+
+# import main (and the model) in the master before forking
+preload_app = True
+
+
+def on_starting(server):
+    import analyzer
+
+    analyzer.preload_model()
+
+    # keep the inherited objects out of every worker's GC passes, otherwise
+    # collection writes to their pages and un-shares them
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import analyzer
+
+    # split the cores between workers instead of each one using all of them
+    # (EMOTION_TORCH_THREADS, when set, wins at warm-up)
+    cores = os.cpu_count() or 1
+    analyzer.set_inference_threads(cores // max(1, server.cfg.workers))
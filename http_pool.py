@@ -0,0 +1,90 @@
+import os
+import asyncio
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------------- POOL SETTINGS ----------------
+
+# one pool per host; keep-alive connections are reused across chat turns
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE_S = float(os.getenv("HTTP_KEEPALIVE_S", "60"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+
+
+_session = None
+_session_lock = threading.Lock()
+
+_async_client = None
+_async_loop = None
+
+
+# ---------------- TIMEOUTS ----------------
+
+def sync_timeout(read_s: float):
+    return (HTTP_CONNECT_TIMEOUT_S, read_s)
+
+
+def async_timeout(read_s: float) -> httpx.Timeout:
+    return httpx.Timeout(read_s, connect=HTTP_CONNECT_TIMEOUT_S)
+
+
+# ---------------- SYNC CLIENT ----------------
+
+def make_session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def get_session() -> requests.Session:
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = make_session()
+
+    return _session
+
+
+# ---------------- ASYNC CLIENT ----------------
+
+def make_async_client(**kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_SIZE,
+            max_keepalive_connections=HTTP_POOL_SIZE,
+            keepalive_expiry=HTTP_KEEPALIVE_S
+        ),
+        **kwargs
+    )
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client, _async_loop
+
+    loop = asyncio.get_running_loop()
+
+    # an AsyncClient's connections belong to the loop that opened them
+    if _async_client is None or _async_client.is_closed or _async_loop is not loop:
+        _async_client = make_async_client()
+        _async_loop = loop
+
+    return _async_client
+
+
+async def aclose_clients():
+    global _async_client, _session
+
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+    if _session is not None:
+        _session.close()
+        _session = None
@@ -0,0 +1,192 @@
+import os
+import re
+import bisect
+import hashlib
+
+from langdetect import DetectorFactory, detect
+
+from cache import LRUCache, MISSING
+
+# ---------------- SETTINGS ----------------
+
+# langdetect is randomized per call unless seeded
+DetectorFactory.seed = 0
+
+# langdetect cost grows with input length; the head of a message is plenty
+LANGDETECT_MAX_CHARS = int(os.getenv("LANGDETECT_MAX_CHARS", "1000"))
+LANG_CACHE_SIZE = int(os.getenv("LANG_CACHE_SIZE", "4096"))
+
+SHORT_TEXT_CHARS = 20   # shorter messages are assumed English, as before
+
+lang_cache = LRUCache(max_entries=LANG_CACHE_SIZE, name="language")
+
+lang_stats = {"short": 0, "script": 0, "stopwords": 0, "detector": 0}
+
+
+# ---------------- SCRIPT FAST PATH ----------------
+
+# scripts that map to a single langdetect code; Latin, Cyrillic, Arabic
+# and Devanagari are shared by several languages and go to the detector
+SCRIPT_RANGES = [
+    (0x0370, 0x03FF, "el"),
+    (0x0590, 0x05FF, "he"),
+    (0x0980, 0x09FF, "bn"),
+    (0x0A00, 0x0A7F, "pa"),
+    (0x0A80, 0x0AFF, "gu"),
+    (0x0B80, 0x0BFF, "ta"),
+    (0x0C00, 0x0C7F, "te"),
+    (0x0C80, 0x0CFF, "kn"),
+    (0x0D00, 0x0D7F, "ml"),
+    (0x0E00, 0x0E7F, "th"),
+    (0x1100, 0x11FF, "ko"),
+    (0x3040, 0x30FF, "ja"),
+    (0xAC00, 0xD7AF, "ko"),
+]
+_RANGE_STARTS = [r[0] for r in SCRIPT_RANGES]
+
+
+def script_language(text: str):
+    """Language of the dominant single-language script, if any."""
+
+    counts = {}
+    letters = 0
+
+    for ch in text:
+        cp = ord(ch)
+        if cp < 0x80:
+            if ch.isalpha():
+                letters += 1
+            continue
+
+        if not ch.isalpha():
+            continue
+        letters += 1
+
+        i = bisect.bisect_right(_RANGE_STARTS, cp) - 1
+        if i >= 0 and cp <= SCRIPT_RANGES[i][1]:
+            code = SCRIPT_RANGES[i][2]
+            counts[code] = counts.get(code, 0) + 1
+
+    if not counts:
+        return None
+
+    code, n = max(counts.items(), key=lambda kv: kv[1])
+    # kana mixed with kanji is still Japanese
+    return code if n * 2 >= letters else None
+
+
+# ---------------- STOPWORD FAST PATH ----------------
+
+STOPWORDS = {
+    "en": {
+        "the", "and", "is", "are", "was", "you", "i", "my", "me", "it",
+        "to", "of", "that", "this", "what", "have", "with", "for", "not",
+        "just", "so", "but", "be", "do", "don't", "i'm", "im", "can",
+        "how", "about", "your", "it's", "we", "they", "he", "she", "feel",
+        "really", "like", "today", "am", "been", "if", "at", "on",
+    },
+    "es": {
+        "el", "la", "los", "las", "que", "y", "es", "en", "un", "una",
+        "por", "para", "con", "muy", "pero", "estoy", "está", "mi", "lo",
+        "como", "qué", "yo", "del", "se", "me",
+    },
+    "fr": {
+        "le", "la", "les", "et", "est", "je", "tu", "une", "des", "pas",
+        "que", "qui", "dans", "pour", "avec", "mais", "suis", "très",
+        "c'est", "ce", "mon", "ma", "il", "elle", "vous", "nous",
+    },
+    "de": {
+        "der", "die", "das", "und", "ist", "ich", "nicht", "ein", "eine",
+        "zu", "mit", "auf", "für", "aber", "sehr", "bin", "du", "wir",
+        "mein", "was", "wie", "auch",
+    },
+    "pt": {
+        "os", "as", "que", "de", "é", "não", "um", "uma", "com", "para",
+        "mas", "muito", "estou", "eu", "meu", "minha", "você", "isso",
+    },
+    "it": {
+        "il", "lo", "gli", "che", "di", "è", "non", "un", "una", "per",
+        "con", "ma", "molto", "sono", "io", "mio", "mia", "questo",
+    },
+    "nl": {
+        "de", "het", "een", "en", "ik", "niet", "van", "dat", "met",
+        "voor", "maar", "zijn", "je", "wat", "ook",
+    },
+}
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+MIN_STOPWORDS = 2          # hits needed for the winning language
+MIN_STOPWORD_SHARE = 0.2   # of all words in the message
+MIN_MARGIN = 2.0           # winner must have this many times the runner-up
+
+
+def stopword_language(text: str):
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+
+    hits = {lang: 0 for lang in STOPWORDS}
+    for w in words:
+        for lang, stop in STOPWORDS.items():
+            if w in stop:
+                hits[lang] += 1
+
+    ranked = sorted(hits.items(), key=lambda kv: kv[1], reverse=True)
+    (best, n), (_, runner_up) = ranked[0], ranked[1]
+
+    if n < MIN_STOPWORDS or n < MIN_STOPWORD_SHARE * len(words):
+        return None
+    if n < MIN_MARGIN * runner_up:
+        return None
+    return best
+
+
+# ---------------- PUBLIC ----------------
+
+def language_key(clean: str) -> str:
+    return hashlib.sha1(clean.encode("utf-8")).hexdigest()
+
+
+def identify(clean: str) -> str:
+    if len(clean) < SHORT_TEXT_CHARS:
+        lang_stats["short"] += 1
+        return "en"
+
+    head = clean[:LANGDETECT_MAX_CHARS]
+
+    lang = script_language(head)
+    if lang:
+        lang_stats["script"] += 1
+        return lang
+
+    lang = stopword_language(head)
+    if lang:
+        lang_stats["stopwords"] += 1
+        return lang
+
+    lang_stats["detector"] += 1
+    try:
+        return detect(head)
+    except Exception:
+        return "unknown"
+
+
+def detect_language(text: str) -> str:
+
+    clean = (text or "").strip()
+    if not clean:
+        return "unknown"
+
+    key = language_key(clean)
+    cached = lang_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    lang = identify(clean)
+    lang_cache.set(key, lang)
+    return lang
+
+
+def language_stats() -> dict:
+    return {**lang_cache.stats(), **lang_stats}
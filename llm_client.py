@@ -1,123 +1,565 @@
 import os
 import time
+import json
+import asyncio
 import requests
+import httpx
 from dotenv import load_dotenv
 
+import metrics
+from signals import scan
+from prompt_builder import (
+    Prompt, GRIEF_CONTRACT, DISTRESS_CONTRACT, POSITIVE_CONTRACT, GENERAL_CONTRACT,
+    estimate_tokens
+)
+from http_pool import get_session, get_async_client, sync_timeout, async_timeout
+from resilience import (
+    CircuitBreaker, Deadline, LatencyTracker, UNHEALTHY_STATUS,
+    backoff_delay, classify, retry_after
+)
+from rate_limiter import PRIORITY_REPLY, RateLimitScheduler, RateLimited
+
 load_dotenv(".env")
 
 GROQ_KEY = os.getenv("GROQ_API_KEY")
 print("GROQ KEY FOUND:", bool(GROQ_KEY))
 
-URL = "https://api.groq.com/openai/v1/chat/completions"
+# any OpenAI-compatible endpoint (e.g. the benchmark stub)
+URL = os.getenv("LLM_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "45"))   # per attempt
+
+# -------- resilience settings --------
+
+# every retry, backoff and Retry-After wait fits inside this budget
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "20"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_CAP_S = float(os.getenv("LLM_BACKOFF_CAP_S", "4"))
+
+# hedging (async only): a second identical request once the first is
+# slower than the recent p95; off by default as it adds upstream load
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "0.5"))
+
+llm_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+    name="llm"
+)
+llm_latency = LatencyTracker()
+
+# -------- rate limits --------
+
+# 0 = learn the limits from the x-ratelimit-* headers of the first
+# responses (and honor Retry-After); set them to pace from the first call
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_RATE_WINDOW_S = float(os.getenv("LLM_RATE_WINDOW_S", "60"))
+
+# summaries and rewrites queue behind user replies, so they get longer
+LLM_BACKGROUND_DEADLINE_S = float(os.getenv("LLM_BACKGROUND_DEADLINE_S", "120"))
+
+llm_limiter = RateLimitScheduler(LLM_RPM, LLM_TPM, LLM_RATE_WINDOW_S, name="llm")
 
 
 # -------- prompt type detectors --------
 
 def is_grief_prompt(prompt: str) -> bool:
-    p = prompt.lower()
-    return any(w in p for w in [
-        "passed away", "died", "lost my",
-        "funeral", "bereavement"
-    ])
+    return "grief_prompt" in scan(prompt)
 
 
 def is_distress_prompt(prompt: str) -> bool:
-    p = prompt.lower()
-    return any(w in p for w in [
-        "strong_distress", "distress",
-        "overwhelmed", "frustrated",
-        "sad", "stress", "not okay"
-    ])
+    return "distress_prompt" in scan(prompt)
 
 
 def is_positive_prompt(prompt: str) -> bool:
-    p = prompt.lower()
-    return any(w in p for w in [
-        "super_happy", "happy", "joy", "positive"
-    ])
+    return "positive_prompt" in scan(prompt)
 
 
-# -------- main call --------
+# -------- request payload --------
 
-def generate_reply(prompt: str) -> str:
+CONFIG_ERROR_REPLY = "System configuration error."
+GLITCH_REPLY = "Something glitched — can you say that again?"
 
-    if not GROQ_KEY:
-        return "System configuration error."
+# served without calling upstream while the circuit is open
+FALLBACK_REPLY = "I'm still here — my thoughts are a bit slow right now. Can you give me a moment and say that again?"
 
-    # ----- system behavior contracts -----
 
-    if is_grief_prompt(prompt):
+def is_error_reply(text: str) -> bool:
+    # fallback strings are fine to show a user, never to store as content
+    return text in (CONFIG_ERROR_REPLY, GLITCH_REPLY, FALLBACK_REPLY)
 
-        system_msg = (
-            "User is grieving. Write 3 to 4 medium-long emotionally rich "
-            "consolation sentences. Be warm, present, and human. "
-            "Do NOT ask any questions. Only comfort and validate."
-        )
-        max_tokens = 360
 
-    elif is_distress_prompt(prompt):
+def legacy_contract(prompt: str):
+    """System message and token budget for free-form string prompts."""
 
-        system_msg = (
-            "User is emotionally distressed. Write 3 to 5 medium-long "
-            "supportive sentences. Validate feelings first. "
-            "You MUST include exactly ONE gentle open-ended question "
-            "asking what happened or what led to this. "
-            "Do not ask more than one question. "
-            "Keep conversation continuity."
-        )
-        max_tokens = 340
+    hits = scan(prompt)
 
-    elif is_positive_prompt(prompt):
+    if "grief_prompt" in hits:
+        return GRIEF_CONTRACT, 360
 
-        system_msg = (
-            "User is feeling positive. Write 3 to 4 supportive, upbeat "
-            "medium-length sentences. Encouraging and grounded. "
-            "You MAY include one light forward-looking question."
-        )
-        max_tokens = 260
+    if "distress_prompt" in hits:
+        return DISTRESS_CONTRACT, 340
 
-    else:
+    if "positive_prompt" in hits:
+        return POSITIVE_CONTRACT, 260
 
-        system_msg = (
-            "Write 2 to 3 medium-length friendly conversational sentences."
-        )
-        max_tokens = 220
+    return GENERAL_CONTRACT, 220
 
-    payload = {
-        "model": "llama-3.1-8b-instant",
-        "messages": [
+
+def build_payload(prompt) -> dict:
+    """
+    `prompt` is a prompt_builder.Prompt, which already carries its route,
+    messages and token budget, or a plain string (summary / rewrite
+    passes), which is routed by keyword scan.
+    """
+
+    if isinstance(prompt, Prompt):
+        messages = prompt.messages
+        max_tokens = prompt.max_tokens
+    else:
+        system_msg, max_tokens = legacy_contract(prompt)
+        messages = [
             {"role": "system", "content": system_msg},
             {"role": "user", "content": prompt}
-        ],
+        ]
+
+    return {
+        "model": "llama-3.1-8b-instant",
+        "messages": messages,
         "temperature": 0.75,
         "max_tokens": max_tokens
     }
 
-    headers = {
+
+def estimate_cost(payload) -> int:
+    # reserve the whole completion budget; the unused part is refunded
+    # from the response's usage
+    text = " ".join(m["content"] for m in payload["messages"])
+    return estimate_tokens(text) + payload["max_tokens"]
+
+
+# -------- metrics --------
+
+LLM_REQUESTS = metrics.counter(
+    "llm_requests_total", "LLM calls by mode and outcome", labels=("mode", "outcome")
+)
+LLM_RETRIES = metrics.counter("llm_retries_total", "LLM attempts retried (transport error, 429 or 5xx)")
+LLM_HEDGES = metrics.counter("llm_hedges_total", "Hedged second requests sent")
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total", "Tokens reported by the LLM API", labels=("kind",)
+)
+
+
+def record_usage(data):
+    usage = data.get("usage") or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+
+    LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, kind="prompt")
+    LLM_TOKENS.inc(usage.get("completion_tokens") or 0, kind="completion")
+    LLM_TOKENS.inc(cached or 0, kind="cached")
+
+
+def auth_headers() -> dict:
+    return {
         "Authorization": f"Bearer {GROQ_KEY}",
         "Content-Type": "application/json"
     }
 
+
+# -------- attempt bookkeeping --------
+
+def record_response(status: int, seconds: float) -> str:
+    verdict = classify(status)
+
+    # 4xx and 429 mean the upstream is up and answering
+    if status in UNHEALTHY_STATUS:
+        llm_breaker.record_failure()
+    else:
+        llm_breaker.record_success()
+
+    if verdict == "ok":
+        llm_latency.record(seconds)
+    return verdict
+
+
+def record_limits(r, cost: int):
+    llm_limiter.observe(r.headers)
+
+    if r.status_code == 429:
+        llm_limiter.pause(retry_after(r.headers))
+
+    # a rejected request spent a request slot, not tokens
+    if r.status_code != 200:
+        llm_limiter.release(cost, 0)
+
+
+def call_deadline(priority: int) -> Deadline:
+    if priority == PRIORITY_REPLY:
+        return Deadline(LLM_DEADLINE_S)
+    return Deadline(max(LLM_DEADLINE_S, LLM_BACKGROUND_DEADLINE_S))
+
+
+def next_delay(attempt: int, wait, deadline: Deadline):
+    """Seconds to wait before the next attempt, or None to give up."""
+
+    if attempt + 1 >= LLM_MAX_ATTEMPTS or llm_breaker.state == "open":
+        return None
+
+    delay = wait if wait is not None else backoff_delay(attempt, LLM_BACKOFF_BASE_S, LLM_BACKOFF_CAP_S)
+
+    # the retry needs time to run, not just to start
+    if delay >= deadline.remaining():
+        return None
+    return delay
+
+
+def read_reply(prompt, data, mode: str, cost: int):
+    record_usage(data)
+    llm_limiter.release(cost, (data.get("usage") or {}).get("total_tokens"))
+
+    if data.get("choices"):
+        LLM_REQUESTS.inc(mode=mode, outcome="ok")
+        return data["choices"][0]["message"]["content"].strip()
+
+    LLM_REQUESTS.inc(mode=mode, outcome="empty")
+    return None
+
+
+# -------- main call --------
+
+def generate_reply(prompt, priority: int = PRIORITY_REPLY) -> str:
+
+    if not GROQ_KEY:
+        return CONFIG_ERROR_REPLY
+
+    if not llm_breaker.allow():
+        LLM_REQUESTS.inc(mode="sync", outcome="short_circuit")
+        return FALLBACK_REPLY
+
+    payload = build_payload(prompt)
+    headers = auth_headers()
+    deadline = call_deadline(priority)
+    cost = estimate_cost(payload)
+
     # ----- retry wrapper -----
 
-    for attempt in range(3):
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        wait = None
+
         try:
-            r = requests.post(URL, headers=headers, json=payload, timeout=45)
+            llm_limiter.acquire(cost, priority, timeout=deadline.remaining())
+        except RateLimited as e:
+            print("LLM rate limited:", e)
+            LLM_REQUESTS.inc(mode="sync", outcome="rate_limited")
+            return FALLBACK_REPLY
 
-            if r.status_code == 200:
-                data = r.json()
-                if data.get("choices"):
-                    return data["choices"][0]["message"]["content"].strip()
-            else:
-                return f"LLM HTTP error {r.status_code}"
+        started = time.perf_counter()
 
+        try:
+            r = get_session().post(
+                URL, headers=headers, json=payload,
+                timeout=sync_timeout(min(LLM_TIMEOUT_S, deadline.remaining()))
+            )
         except requests.exceptions.RequestException as e:
             print("LLM retry:", e)
-            time.sleep(1.5 * (attempt + 1))
+            llm_breaker.record_failure()
+            llm_limiter.release(cost, 0)
+        else:
+            verdict = record_response(r.status_code, time.perf_counter() - started)
+            record_limits(r, cost)
+
+            if verdict == "ok":
+                reply = read_reply(prompt, r.json(), "sync", cost)
+                if reply is not None:
+                    return reply
+            elif verdict == "fail":
+                # a request the upstream will never accept; not worth retrying
+                print("LLM HTTP error:", r.status_code)
+                LLM_REQUESTS.inc(mode="sync", outcome=f"http_{r.status_code}")
+                return GLITCH_REPLY
+            else:
+                wait = retry_after(r.headers)
+
+        delay = next_delay(attempt, wait, deadline)
+        if delay is None:
+            break
+
+        LLM_RETRIES.inc()
+        time.sleep(delay)
+
+    LLM_REQUESTS.inc(mode="sync", outcome="failed")
+    return GLITCH_REPLY
+
+
+# -------- async call --------
+
+async def post_hedged(client, headers, payload, timeout: float, cost: int):
+    """
+    POST once; if no answer within the recent p95 latency, send the same
+    request again and take whichever succeeds first. The hedge only goes
+    out if the rate limiter has budget to spare right now.
+
+    The caller settles `cost` for whichever response it gets back; the
+    hedge's own reservation is returned here.
+    """
+
+    def send(t):
+        return asyncio.ensure_future(client.post(
+            URL, headers=headers, json=payload, timeout=async_timeout(t)
+        ))
+
+    p95 = llm_latency.percentile(0.95) if LLM_HEDGE and llm_breaker.state == "closed" else None
+    delay = None if p95 is None else max(LLM_HEDGE_MIN_DELAY_S, p95)
+
+    if delay is None or delay >= timeout:
+        return await send(timeout)
+
+    tasks = [send(timeout)]
+    hedged = False
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
 
-    return "Something glitched — can you say that again?"
+        if not llm_limiter.try_acquire(cost):
+            return await tasks[0]
+
+        hedged = True
+        LLM_HEDGES.inc()
+        tasks.append(send(timeout - delay))
+
+        pending, last = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                last = t
+                if t.exception() is None and t.result().status_code == 200:
+                    return t.result()
+
+        return last.result()
+
+    finally:
+        for t in tasks:
+            t.cancel()
+        if hedged:
+            llm_limiter.release(cost, 0)
+
+
+async def agenerate_reply(prompt, priority: int = PRIORITY_REPLY) -> str:
+
+    if not GROQ_KEY:
+        return CONFIG_ERROR_REPLY
+
+    if not llm_breaker.allow():
+        LLM_REQUESTS.inc(mode="async", outcome="short_circuit")
+        return FALLBACK_REPLY
+
+    payload = build_payload(prompt)
+    headers = auth_headers()
+    deadline = call_deadline(priority)
+    cost = estimate_cost(payload)
+
+    # ----- retry wrapper (non-blocking waits) -----
+
+    client = get_async_client()
+
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        wait = None
+
+        try:
+            await llm_limiter.acquire_async(cost, priority, timeout=deadline.remaining())
+        except RateLimited as e:
+            print("LLM rate limited:", e)
+            LLM_REQUESTS.inc(mode="async", outcome="rate_limited")
+            return FALLBACK_REPLY
+
+        started = time.perf_counter()
+
+        try:
+            r = await post_hedged(
+                client, headers, payload, min(LLM_TIMEOUT_S, deadline.remaining()), cost
+            )
+        except httpx.HTTPError as e:
+            print("LLM retry:", e)
+            llm_breaker.record_failure()
+            llm_limiter.release(cost, 0)
+        else:
+            verdict = record_response(r.status_code, time.perf_counter() - started)
+            record_limits(r, cost)
+
+            if verdict == "ok":
+                reply = read_reply(prompt, r.json(), "async", cost)
+                if reply is not None:
+                    return reply
+            elif verdict == "fail":
+                # a request the upstream will never accept; not worth retrying
+                print("LLM HTTP error:", r.status_code)
+                LLM_REQUESTS.inc(mode="async", outcome=f"http_{r.status_code}")
+                return GLITCH_REPLY
+            else:
+                wait = retry_after(r.headers)
+
+        delay = next_delay(attempt, wait, deadline)
+        if delay is None:
+            break
+
+        LLM_RETRIES.inc()
+        await asyncio.sleep(delay)
+
+    LLM_REQUESTS.inc(mode="async", outcome="failed")
+    return GLITCH_REPLY
+
+
+# -------- streaming call --------
+
+async def stream_reply(prompt):
+    """
+    Yield reply text deltas from a streamed (SSE) completion.
+
+    Closing this generator early closes the upstream response, so callers
+    stop paying for tokens they will not use.
+    """
+
+    if not GROQ_KEY:
+        yield CONFIG_ERROR_REPLY
+        return
+
+    if not llm_breaker.allow():
+        LLM_REQUESTS.inc(mode="stream", outcome="short_circuit")
+        yield FALLBACK_REPLY
+        return
+
+    payload = build_payload(prompt)
+    payload["stream"] = True
+    headers = auth_headers()
+    deadline = Deadline(LLM_DEADLINE_S)
+    cost = estimate_cost(payload)
+    client = get_async_client()
+
+    # ----- retry wrapper (until the first byte) -----
+
+    r = None
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        wait = None
+
+        try:
+            await llm_limiter.acquire_async(cost, PRIORITY_REPLY, timeout=deadline.remaining())
+        except RateLimited as e:
+            print("LLM rate limited:", e)
+            LLM_REQUESTS.inc(mode="stream", outcome="rate_limited")
+            yield FALLBACK_REPLY
+            return
+
+        request = client.build_request(
+            "POST", URL, headers=headers, json=payload,
+            timeout=async_timeout(min(LLM_TIMEOUT_S, deadline.remaining()))
+        )
+        try:
+            r = await client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            print("LLM retry:", e)
+            llm_breaker.record_failure()
+            llm_limiter.release(cost, 0)
+        else:
+            # latency is not recorded: time to headers is not a full reply
+            if r.status_code in UNHEALTHY_STATUS:
+                llm_breaker.record_failure()
+            else:
+                llm_breaker.record_success()
+            record_limits(r, cost)
+
+            verdict = classify(r.status_code)
+            if verdict == "ok":
+                break
+
+            # nothing was sent to the caller yet, so the attempt can be retried
+            await r.aclose()
+            status, wait, r = r.status_code, retry_after(r.headers), None
+
+            if verdict == "fail":
+                print("LLM stream HTTP error:", status)
+                LLM_REQUESTS.inc(mode="stream", outcome=f"http_{status}")
+                yield GLITCH_REPLY
+                return
+
+        delay = next_delay(attempt, wait, deadline)
+        if delay is None:
+            break
+
+        LLM_RETRIES.inc()
+        await asyncio.sleep(delay)
+
+    if r is None:
+        LLM_REQUESTS.inc(mode="stream", outcome="failed")
+        yield FALLBACK_REPLY
+        return
+
+    # ----- stream -----
+
+    LLM_REQUESTS.inc(mode="stream", outcome="ok")
+    streamed = False
+    completion = 0
+
+    try:
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+
+            choices = json.loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                streamed = True
+                completion += estimate_tokens(delta)
+                yield delta
+
+    except httpx.HTTPError as e:
+        llm_breaker.record_failure()
+        LLM_REQUESTS.inc(mode="stream", outcome="error")
+        print("LLM stream error:", e)
+        if not streamed:
+            yield GLITCH_REPLY
+
+    finally:
+        # streamed chunks carry no usage; refund by our own count, also
+        # when the caller closes early (sentence cap) or the stream breaks
+        llm_limiter.release(cost, cost - payload["max_tokens"] + completion)
+        await r.aclose()
+
+
+# -------- health --------
+
+def llm_stats() -> dict:
+    p95 = llm_latency.percentile(0.95)
+    return {
+        "breaker": llm_breaker.stats(),
+        "latency_p95_s": round(p95, 3) if p95 is not None else None,
+        "hedging": LLM_HEDGE,
+        "rate_limits": llm_limiter.stats(),
+    }
+
+
+@metrics.collector
+def llm_metrics():
+    b = llm_breaker.stats()
+    rl = llm_limiter.stats()
+    return [
+        ("llm_circuit_open", "gauge", "1 while the LLM circuit breaker is open", int(b["state"] == "open")),
+        ("llm_short_circuited_total", "counter", "LLM calls refused by the open circuit", b["short_circuited"]),
+        ("llm_rate_limit_queued", "gauge", "LLM calls waiting for a rate-limit slot", rl["queued"]),
+        ("llm_rate_limit_timeouts_total", "counter", "LLM calls that gave up waiting for a slot", rl["timeouts"]),
+        ("llm_rate_limit_pauses_total", "counter", "Retry-After pauses applied to all LLM calls", rl["pauses"]),
+    ]
 
 
 # backward compatibility for your imports
-def ask_llm(prompt: str) -> str:
-    return generate_reply(prompt)
+def ask_llm(prompt, priority: int = PRIORITY_REPLY) -> str:
+    return generate_reply(prompt, priority)
+
+
+async def ask_llm_async(prompt, priority: int = PRIORITY_REPLY) -> str:
+    return await agenerate_reply(prompt, priority)
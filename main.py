@@ -1,19 +1,36 @@
+import time
+
+# import-to-first-response is measured from here
+PROCESS_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware   # ✅ ADD
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
+import os
+import json
 
-from analyzer import analyze_text
-from memory import add_message, get_context, save_summary, get_summary
-from prompt_builder import build_prompt
-from reply_filter import limit_sentences
-from summary_builder import build_convo_summary
-from llm_client import ask_llm
+import analyzer
+from analyzer import analyze_text_async, detect_language_async, analysis_cache
+from memory import (
+    add_message, get_summary, load_turn_memory, store_call, memory_stats
+)
+from prompt_builder import build_prompt, prompt_token_stats
+from reply_filter import limit_sentences, SentenceLimiter
+from summary_worker import summary_scheduler
+from llm_client import ask_llm_async, stream_reply, llm_stats
+from stages import Stage, run_stages
+from signals import extract_signals, signal_cache
+from language_id import language_stats
+from http_pool import aclose_clients
+from batcher import Overloaded
+import metrics
 
 # ✅ search layer
 from search_trigger import should_web_search
-from search_client import web_search
+from search_client import web_search_async, search_stats
 
 
 app = FastAPI()
@@ -32,6 +49,26 @@ app.add_middleware(
 )
 
 
+# optional stages are dropped from the prompt once they miss their budget
+SEARCH_DEADLINE_S = float(os.getenv("SEARCH_STAGE_DEADLINE_MS", "1500")) / 1000
+
+
+# ---------------- startup ----------------
+
+startup_metrics = {"first_response_s": None}
+
+
+@app.on_event("startup")
+async def begin_model_warmup():
+    startup_metrics["app_startup_s"] = round(time.perf_counter() - PROCESS_STARTED, 3)
+    analyzer.start_warmup()
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await aclose_clients()
+
+
 # ---------------- request schema ----------------
 
 class ChatRequest(BaseModel):
@@ -40,65 +77,238 @@ class ChatRequest(BaseModel):
     timestamp: Optional[str] = None
 
 
-# ---------------- route ----------------
+# ---------------- turn pipeline ----------------
 
-@app.post("/chat")
-def chat(data: ChatRequest):
+async def prepare_turn(data: ChatRequest):
 
     text = data.text.strip()
     sid = data.anon_userid
 
+    # one keyword scan shared by routing, search trigger and guardrail
+    signals = extract_signals(text)
+
+    # ---- admission: shed before anything is stored ----
+    analyzer.check_admission()
+
     # ---- memory write ----
-    add_message(sid, text)
+    with metrics.span("memory"):
+        add_message(sid, text)
 
-    context = get_context(sid)
-    analysis = analyze_text(text)
+        # only the slices this turn uses are formatted
+        memory_block, old_summary = await store_call(load_turn_memory, sid, 6)
 
-    memory_block = " | ".join(context[-6:])
-    old_summary = get_summary(sid)
+    # ---------------- analysis + web search (parallel) ----------------
 
-    # ---------------- web search layer ----------------
+    stages = [
+        Stage("analysis", metrics.timed("analysis", lambda: analyze_text_async(text, detect_lang=False))),
+        Stage("language", metrics.timed("language", lambda: detect_language_async(text))),
+    ]
 
-    search_context = ""
+    if should_web_search(signals):
+        stages.append(Stage(
+            "search",
+            metrics.timed("search", lambda: web_search_async(text)),
+            deadline=SEARCH_DEADLINE_S,
+            default=""
+        ))
 
-    if should_web_search(text):
-        try:
-            search_context = web_search(text)
-        except Exception as e:
-            print("Search failed:", e)
-            search_context = ""
+    results = await run_stages(stages)
+
+    analysis = results["analysis"]
+    if analysis["language"] is None:
+        analysis["language"] = results["language"]
+
+    search_context = results.get("search", "")
 
     # ---------------- prompt ----------------
 
-    prompt = build_prompt(
-        raw_text=text,
-        analysis=analysis,
-        memory=memory_block,
-        convo_summary=old_summary,
-        search_context=search_context
-    )
+    with metrics.span("prompt"):
+        prompt = build_prompt(
+            raw_text=text,
+            analysis=analysis,
+            memory=memory_block,
+            convo_summary=old_summary,
+            search_context=search_context,
+            signals=signals
+        )
 
-    # ---------------- LLM ----------------
+    return {
+        "sid": sid,
+        "text": text,
+        "signals": signals,
+        "analysis": analysis,
+        "prompt": prompt
+    }
 
-    raw_reply = ask_llm(prompt)
 
-    # ---------------- guardrail ----------------
+async def finish_turn(turn, reply):
+
+    sid = turn["sid"]
 
-    reply = limit_sentences(raw_reply, text)
+    # ---------------- rolling summary (background) ----------------
 
-    # ---------------- rolling summary ----------------
+    await store_call(summary_scheduler.note_turn, sid)
 
-    if len(context) > 0 and len(context) % 10 == 0:
-        summary = build_convo_summary(context)
-        save_summary(sid, summary)
+    if startup_metrics["first_response_s"] is None:
+        startup_metrics["first_response_s"] = round(time.perf_counter() - PROCESS_STARTED, 3)
 
     # ---------------- response ----------------
 
     return {
         "reply": reply,
-        "overall_emotion": analysis["overall"],
-        "analysis": analysis,
-        "stored_summary": get_summary(sid),
+        "overall_emotion": turn["analysis"]["overall"],
+        "analysis": turn["analysis"],
+        "stored_summary": await store_call(get_summary, sid),
         "timestamp": datetime.utcnow().isoformat(),
         "anon_userid": sid
     }
+
+
+# ---------------- timing ----------------
+
+TIMED_PATHS = {"/chat", "/chat/stream"}
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds", "Chat request latency up to the response headers", labels=("path",)
+)
+
+
+@app.middleware("http")
+async def server_timing(request, call_next):
+    path = request.url.path
+    if path not in TIMED_PATHS:
+        return await call_next(request)
+
+    timings = metrics.begin_request()
+    started = time.perf_counter()
+
+    response = await call_next(request)
+
+    total = time.perf_counter() - started
+    REQUEST_SECONDS.observe(total, path=path)
+    response.headers["Server-Timing"] = metrics.server_timing(timings + [("total", total)])
+    return response
+
+
+# ---------------- overload ----------------
+
+@app.exception_handler(Overloaded)
+async def overloaded(request, exc):
+    return JSONResponse(
+        {"error": "busy", "detail": str(exc)},
+        status_code=429,
+        headers={"Retry-After": "1"}
+    )
+
+
+# ---------------- routes ----------------
+
+@app.post("/chat")
+async def chat(data: ChatRequest):
+
+    turn = await prepare_turn(data)
+
+    # ---------------- LLM ----------------
+
+    with metrics.span("llm"):
+        raw_reply = await ask_llm_async(turn["prompt"])
+
+    # ---------------- guardrail ----------------
+
+    reply = limit_sentences(raw_reply, turn["signals"])
+
+    return await finish_turn(turn, reply)
+
+
+@app.get("/ready")
+def ready():
+    """200 once the model is warm (or has failed and we stay on heuristics)."""
+
+    state = analyzer.model_state
+    timings = dict(analyzer.model_timings)
+    ready_at = timings.pop("ready_at", None)
+
+    body = {
+        "ready": state in ("ready", "failed"),
+        "model": state,
+        "serving": "model" if state == "ready" else "heuristic",
+        "startup": {
+            **startup_metrics,
+            **{f"model_{k}": v for k, v in timings.items()},
+            "model_ready_s": round(ready_at - PROCESS_STARTED, 3) if ready_at else None,
+        },
+    }
+
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "search_cache": search_stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "signal_cache": signal_cache.stats(),
+        "language": language_stats(),
+        "inference": analyzer.inference_stats(),
+        "llm": llm_stats(),
+        "prompt_tokens": prompt_token_stats,
+        "sessions": memory_stats(),
+        "summaries": summary_scheduler.stats()
+    }
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def sse(payload, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(data: ChatRequest):
+    """
+    Server-sent events: `data: {"delta": ...}` per finished sentence, then
+    one `event: done` carrying the same body /chat returns.
+    """
+
+    turn = await prepare_turn(data)
+
+    async def events():
+
+        # ---- guardrail applied while streaming ----
+        limiter = SentenceLimiter(turn["signals"])
+        sent = ""
+
+        upstream = stream_reply(turn["prompt"])
+        started = time.perf_counter()
+        first = True
+        try:
+            async for delta in upstream:
+                if first:
+                    metrics.record("llm_first_token", time.perf_counter() - started)
+                    first = False
+
+                for sentence in limiter.feed(delta):
+                    piece = f" {sentence}" if sent else sentence
+                    sent += piece
+                    yield sse({"delta": piece})
+
+                # sentence cap reached — stop generating upstream
+                if limiter.done:
+                    break
+        finally:
+            await upstream.aclose()
+            metrics.record("llm_stream", time.perf_counter() - started)
+
+        # ---- tail + continuity rule ----
+        reply = limiter.finish()
+        tail = reply[len(sent):]
+        if tail:
+            yield sse({"delta": tail})
+
+        yield sse(await finish_turn(turn, reply), event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
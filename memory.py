@@ -1,37 +1,132 @@
-from datetime import datetime
+import os
+import asyncio
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 
-chat_memory = {}
-chat_summaries = {}
+from session_store import make_store, Message
 
 MAX_LINES = 50
 
+# "memory" (per process) or "sqlite" (shared by all workers on the host)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
 
-def add_message(session_id: str, text: str, role: str = "user", emotion: str = ""):
+store = make_store(SESSION_STORE, MAX_LINES)
 
-    chat_memory.setdefault(session_id, []).append({
-        "role": role,
-        "text": text,
-        "emotion": emotion,
-        "ts": datetime.utcnow().isoformat()
-    })
 
-    chat_memory[session_id] = chat_memory[session_id][-MAX_LINES:]
+# ---------------- context view ----------------
 
+class ContextView(Sequence):
+    """
+    Read-only window over the last N turns.
+
+    Lines are formatted as "role: text" (or "role (emotion): text") only
+    when first read, and the view is cached by the store until the
+    session's next write.
+    """
+
+    __slots__ = ("_msgs", "_with_emotion", "_lines", "_joined")
+
+    def __init__(self, msgs, with_emotion=False):
+        self._msgs = msgs
+        self._with_emotion = with_emotion
+        self._lines = [None] * len(msgs)
+        self._joined = {}
+
+    def _format(self, i):
+        line = self._lines[i]
+        if line is None:
+            m = self._msgs[i]
+            if self._with_emotion and m.emotion:
+                line = f"{m.role} ({m.emotion}): {m.text}"
+            else:
+                line = f"{m.role}: {m.text}"
+            self._lines[i] = line
+        return line
+
+    def __len__(self):
+        return len(self._msgs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._format(j) for j in range(*i.indices(len(self._msgs)))]
+        if i < 0:
+            i += len(self._msgs)
+        if not 0 <= i < len(self._msgs):
+            raise IndexError("context index out of range")
+        return self._format(i)
+
+    def joined(self, sep: str = " | ") -> str:
+        text = self._joined.get(sep)
+        if text is None:
+            text = self._joined[sep] = sep.join(self)
+        return text
+
+
+def get_window(session_id: str, n: int, with_emotion: bool = False) -> ContextView:
+    n = min(n, MAX_LINES)
+    return store.view(
+        session_id, n, (n, with_emotion),
+        lambda msgs: ContextView(msgs, with_emotion)
+    )
+
+
+# ---------------- public API ----------------
+
+def add_message(session_id: str, text: str, role: str = "user", emotion: str = ""):
+
+    store.append(session_id, Message(role, text, emotion))
 
-def get_context(session_id: str):
 
-    msgs = chat_memory.get(session_id, [])
+def get_context(session_id: str):
 
     # return readable conversational context
-    return [
-        f'{m["role"]}: {m["text"]}'
-        for m in msgs
-    ]
+    return list(get_window(session_id, MAX_LINES))
+
+
+def turn_count(session_id: str) -> int:
+    # lifetime count — unlike the stored window it never stops growing
+    return store.turn_count(session_id)
+
 
+def save_summary(session_id: str, summary: str, through_turn: int = None, expected_turn: int = None) -> bool:
+    if through_turn is None:
+        through_turn = store.turn_count(session_id)
+    return store.save_summary(session_id, summary, through_turn, expected_turn)
 
-def save_summary(session_id: str, summary: str):
-    chat_summaries[session_id] = summary
+
+def get_summary_state(session_id: str):
+    return store.summary_state(session_id)
 
 
 def get_summary(session_id: str):
-    return chat_summaries.get(session_id, "")
+    return store.summary_state(session_id)[0]
+
+
+def memory_stats() -> dict:
+    return store.stats()
+
+
+# ---------------- async entry ----------------
+
+# sqlite reads hit disk and wait behind a flush, which can itself wait on
+# another worker's write lock; they run here, never on the event loop
+MEMORY_WORKERS = int(os.getenv("MEMORY_WORKERS", "4"))
+
+memory_executor = ThreadPoolExecutor(
+    max_workers=MEMORY_WORKERS,
+    thread_name_prefix="memory"
+)
+
+
+async def store_call(fn, *args):
+    # the in-memory store never blocks: no thread hop
+    if not store.blocking:
+        return fn(*args)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(memory_executor, fn, *args)
+
+
+def load_turn_memory(session_id: str, n: int):
+    """(last n turns joined, stored summary) for building a prompt."""
+    return get_window(session_id, n).joined(" | "), get_summary(session_id)
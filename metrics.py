@@ -0,0 +1,168 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ---------------- METRIC TYPES ----------------
+
+# seconds; chat stages range from sub-millisecond to multi-second LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n=1, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_str(self.labels, key)} {value}"
+
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += n
+                le = _label_str(self.labels + ("le",), key + (bound,))
+                yield f"{self.name}_bucket{le} {cumulative}"
+
+            base = _label_str(self.labels, key)
+            yield f"{self.name}_sum{base} {series[-1]:.6f}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+
+# ---------------- REGISTRY ----------------
+
+_metrics = []
+_collectors = []
+
+
+def counter(name, help, labels=()) -> Counter:
+    m = Counter(name, help, labels)
+    _metrics.append(m)
+    return m
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    m = Histogram(name, help, labels, buckets)
+    _metrics.append(m)
+    return m
+
+
+def collector(fn):
+    """Register fn() -> [(name, kind, help, value)] for values owned elsewhere."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines = []
+
+    for m in _metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.render())
+
+    for fn in _collectors:
+        for name, kind, help, value in fn():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- STAGE SPANS ----------------
+
+STAGE_SECONDS = histogram(
+    "chat_stage_seconds", "Time spent in each stage of a chat turn", labels=("stage",)
+)
+
+# per-request (stage, seconds) list for the Server-Timing header; tasks
+# started inside the request copy the context and share the list
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def begin_request() -> list:
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def timed(stage: str, fn):
+    """Wrap an async callable so every call is recorded as `stage`."""
+
+    async def wrapper(*args, **kwargs):
+        with span(stage):
+            return await fn(*args, **kwargs)
+
+    return wrapper
+
+
+def server_timing(timings) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings)
@@ -0,0 +1,140 @@
+"""
+Optional ONNX Runtime backend for the emotion classifier.
+
+The model is exported to ONNX once and quantized to int8 (dynamic
+quantization of the linear layers), then served through onnxruntime.
+Needs the extra packages in requirements-onnx.txt. Export ahead of
+deploy with:
+
+    python onnx_backend.py export [out_dir]
+
+otherwise the first load exports it (slow, needs torch).
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+ONNX_MODEL_DIR = os.getenv("EMOTION_ONNX_DIR", "onnx_model")
+ONNX_THREADS = int(os.getenv("EMOTION_ONNX_THREADS", "0"))   # 0 = ort default
+
+QUANTIZED_FILE = "model.int8.onnx"
+
+
+# ---------------- EXPORT ----------------
+
+def export_quantized(model_id: str, out_dir: str = ONNX_MODEL_DIR) -> str:
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForSequenceClassification.from_pretrained(model_id)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=14,
+        )
+
+    int8_path = os.path.join(out_dir, QUANTIZED_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+    tokenizer.save_pretrained(out_dir)
+    model.config.save_pretrained(out_dir)
+
+    return int8_path
+
+
+# ---------------- INFERENCE ----------------
+
+class OnnxEmotionClassifier:
+    """
+    Drop-in for the transformers text-classification pipeline as used by
+    analyzer: called with a list of texts, returns the top_k
+    {"label", "score"} dicts per text, scores softmaxed.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, top_k: int = 3):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.top_k = top_k
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        with open(os.path.join(model_dir, "config.json")) as f:
+            id2label = json.load(f)["id2label"]
+        self.labels = [id2label[str(i)] for i in range(len(id2label))]
+
+        opts = ort.SessionOptions()
+        if ONNX_THREADS:
+            opts.intra_op_num_threads = ONNX_THREADS
+
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, QUANTIZED_FILE),
+            sess_options=opts,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, texts, batch_size=None, truncation=True, top_k="", **_):
+
+        if isinstance(texts, str):
+            texts = [texts]
+
+        # same convention as the pipeline: omitted = default, None = all labels
+        k = self.top_k if top_k == "" else (len(self.labels) if top_k is None else top_k)
+
+        enc = self.tokenizer(
+            list(texts), padding=True, truncation=truncation, return_tensors="np"
+        )
+        feed = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+
+        logits = self.session.run(["logits"], feed)[0]
+
+        # softmax, numerically stable
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        out = []
+        for row in probs:
+            top = np.argsort(row)[::-1][:k]
+            out.append([{"label": self.labels[i], "score": float(row[i])} for i in top])
+        return out
+
+
+def load_onnx_classifier(model_id: str, model_dir: str = ONNX_MODEL_DIR):
+    if not os.path.exists(os.path.join(model_dir, QUANTIZED_FILE)):
+        print("No ONNX export found — exporting", model_id, "to", model_dir)
+        export_quantized(model_id, model_dir)
+
+    return OnnxEmotionClassifier(model_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "export":
+        sys.exit("usage: python onnx_backend.py export [out_dir]")
+
+    from analyzer import EMOTION_MODEL
+
+    out = sys.argv[2] if len(sys.argv) > 2 else ONNX_MODEL_DIR
+    print("Wrote", export_quantized(EMOTION_MODEL, out))
@@ -1,79 +1,50 @@
+import os
+import re
+from typing import NamedTuple
+
 from rapport_rules import RAPPORT_RULES
+from signals import as_signals
+from reply_filter import sentence_cap
 
 
 # ---------- intent detectors ----------
 
-def detect_identity_question(text: str) -> bool:
-    t = text.lower()
-    return any(q in t for q in [
-        "who are you", "what are you",
-        "are you a bot", "what can you do"
-    ])
+# keyword tables live in signals.py; each detector reads the one-pass scan
+
+def detect_identity_question(text) -> bool:
+    return as_signals(text).has("identity")
 
 
-def detect_shopping_or_lifestyle(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "buy", "shop", "shirt", "dress",
-        "wear", "outfit", "choose", "which one"
-    ])
+def detect_shopping_or_lifestyle(text) -> bool:
+    return as_signals(text).has("shopping")
 
 
-def detect_grief(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "died", "passed away", "lost my",
-        "death", "funeral", "my pet", "my dog"
-    ])
+def detect_grief(text) -> bool:
+    return as_signals(text).has("grief")
 
 
-def detect_injury(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "broke my", "fracture", "injured",
-        "hurt my", "accident"
-    ])
+def detect_injury(text) -> bool:
+    return as_signals(text).has("injury")
 
 
-def detect_crying(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "i'll cry", "i will cry",
-        "crying", "about to cry"
-    ])
+def detect_crying(text) -> bool:
+    return as_signals(text).has("crying")
 
 
-def detect_goodbye(text: str) -> bool:
-    t = text.lower().strip()
-    return t in ["bye", "goodbye", "gn", "good night", "see you"]
+def detect_goodbye(text) -> bool:
+    return as_signals(text).goodbye
 
 
-def detect_distress_hint(text: str) -> bool:
-    t = text.lower()
-    return any(p in t for p in [
-        "i'm done", "im done",
-        "i give up", "cant anymore",
-        "too much", "over it"
-    ])
+def detect_distress_hint(text) -> bool:
+    return as_signals(text).has("distress_hint")
 
 
-def detect_celebration(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "yay", "yess", "lets go", "let's go",
-        "i got it", "i did it",
-        "finally got", "won"
-    ])
+def detect_celebration(text) -> bool:
+    return as_signals(text).has("celebration")
 
 
-def detect_professional_stress(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "delivery", "deadline", "stakeholder",
-        "client", "timeline", "behind schedule",
-        "delay", "escalation", "project risk",
-        "not on track"
-    ])
+def detect_professional_stress(text) -> bool:
+    return as_signals(text).has("pro_stress")
 
 
 # ---------- helpers ----------
@@ -179,11 +150,171 @@ Do not overuse slang.
 """
 
 
+# ---------- route table ----------
+
+ROUTE_RULES = {
+    "goodbye": GOODBYE_RULE,
+    "grief": GRIEF_RULE,
+    "injury": INJURY_RULE,
+    "crying": CRY_RULE,
+    "pro_stress": PRO_STRESS_RULE,
+    "identity": IDENTITY_RULE,
+    "casual": CASUAL_RULE,
+    "hype": HYPE_RULE,
+    "care": CARE_RULE,
+    "general": "",
+}
+
+EMOTIONAL_ROUTES = {"grief", "injury", "crying", "hype", "care"}
+
+
+# ---------- reply contracts ----------
+
+GRIEF_CONTRACT = (
+    "User is grieving. Write 3 to 4 medium-long emotionally rich "
+    "consolation sentences. Be warm, present, and human. "
+    "Do NOT ask any questions. Only comfort and validate."
+)
+
+DISTRESS_CONTRACT = (
+    "User is emotionally distressed. Write 3 to 5 medium-long "
+    "supportive sentences. Validate feelings first. "
+    "You MUST include exactly ONE gentle open-ended question "
+    "asking what happened or what led to this. "
+    "Do not ask more than one question. "
+    "Keep conversation continuity."
+)
+
+POSITIVE_CONTRACT = (
+    "User is feeling positive. Write 3 to 4 supportive, upbeat "
+    "medium-length sentences. Encouraging and grounded. "
+    "You MAY include one light forward-looking question."
+)
+
+GENERAL_CONTRACT = (
+    "Write 2 to 3 medium-length friendly conversational sentences."
+)
+
+ROUTE_CONTRACTS = {
+    "grief": GRIEF_CONTRACT,
+    "care": DISTRESS_CONTRACT,
+    "crying": DISTRESS_CONTRACT,
+    "injury": DISTRESS_CONTRACT,
+    "hype": POSITIVE_CONTRACT,
+}
+
+
+# the reply is trimmed to sentence_cap sentences, so anything generated
+# past that budget is paid for and thrown away
+TOKENS_PER_SENTENCE = int(os.getenv("LLM_TOKENS_PER_SENTENCE", "45"))
+TOKEN_HEADROOM = int(os.getenv("LLM_TOKEN_HEADROOM", "20"))
+
+
+def token_budget(cap: int) -> int:
+    return cap * TOKENS_PER_SENTENCE + TOKEN_HEADROOM
+
+
+REPLY_FORMAT = """
+Reply in 3–5 medium sentences.
+Natural tone. No robotic phrasing.
+No long paragraphs.
+Reply in the SAME language as the user.
+"""
+
+
+def route_message(text, overall) -> str:
+
+    if detect_goodbye(text):
+        return "goodbye"
+
+    if detect_grief(text):
+        return "grief"
+
+    if detect_injury(text):
+        return "injury"
+
+    if detect_crying(text):
+        return "crying"
+
+    if detect_professional_stress(text):
+        return "pro_stress"
+
+    if detect_identity_question(text):
+        return "identity"
+
+    if detect_shopping_or_lifestyle(text):
+        return "casual"
+
+    if detect_celebration(text) or overall in ["joy", "super_happy", "happy", "positive"]:
+        return "hype"
+
+    if overall in ["distress", "strong_distress", "sadness", "fear", "anger"] \
+       or detect_distress_hint(text):
+        return "care"
+
+    return "general"
+
+
+# ---------- static system prefixes ----------
+
+# built once per route at import, so every request on a route sends a
+# byte-identical prefix the provider can serve from its prompt cache
+
+def system_prefix(route: str) -> str:
+    return f"""
+{RAPPORT_RULES}
+
+{ROUTE_RULES[route]}
+{REPLY_FORMAT}
+{ROUTE_CONTRACTS.get(route, GENERAL_CONTRACT)}
+"""
+
+
+SYSTEM_PREFIXES = {route: system_prefix(route) for route in ROUTE_RULES}
+
+
+# ---------- token accounting ----------
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    # word/punctuation count — close enough to BPE counts for ratios
+    return len(TOKEN_RE.findall(text))
+
+
+STATIC_TOKENS = {route: estimate_tokens(p) for route, p in SYSTEM_PREFIXES.items()}
+
+prompt_token_stats = {"prompts": 0, "static_tokens": 0, "dynamic_tokens": 0}
+
+
+class Prompt(NamedTuple):
+    """Routed LLM request: the client sends it as-is, no re-scanning."""
+
+    route: str
+    system: str
+    user: str
+    sentence_cap: int
+    max_tokens: int
+    static_tokens: int
+    dynamic_tokens: int
+
+    @property
+    def messages(self):
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user}
+        ]
+
+    def __str__(self):
+        return self.system + self.user
+
+
 # ---------- prompt builder ----------
 
-def build_prompt(raw_text, analysis, memory, convo_summary, search_context=""):
+def build_prompt(raw_text, analysis, memory, convo_summary, search_context="", signals=None):
 
-    text = raw_text.lower()
+    text = signals or as_signals(raw_text)
     emotions = [e["label"] for e in analysis["emotions"]]
     overall = analysis["overall"]
 
@@ -195,53 +326,22 @@ def build_prompt(raw_text, analysis, memory, convo_summary, search_context=""):
     stretch = analysis.get("stretch_intense", False)
     bro = analysis.get("bro_style", False)
 
-    extra_rule = ""
-    emotional_mode = False
-
     # ---------- routing ----------
 
-    if detect_goodbye(text):
-        extra_rule = GOODBYE_RULE
-
-    elif detect_grief(text):
-        extra_rule = GRIEF_RULE
-        emotional_mode = True
-
-    elif detect_injury(text):
-        extra_rule = INJURY_RULE
-        emotional_mode = True
-
-    elif detect_crying(text):
-        extra_rule = CRY_RULE
-        emotional_mode = True
-
-    elif detect_professional_stress(text):
-        extra_rule = PRO_STRESS_RULE
+    route = route_message(text, overall)
+    emotional_mode = route in EMOTIONAL_ROUTES
 
-    elif detect_identity_question(text):
-        extra_rule = IDENTITY_RULE
-
-    elif detect_shopping_or_lifestyle(text):
-        extra_rule = CASUAL_RULE
-
-    elif detect_celebration(text) or overall in ["joy", "super_happy", "happy", "positive"]:
-        extra_rule = HYPE_RULE
-        emotional_mode = True
-
-    elif overall in ["distress", "strong_distress", "sadness", "fear", "anger"] \
-         or detect_distress_hint(text):
-        extra_rule = CARE_RULE
-        emotional_mode = True
+    mode_notes = ""
 
     # ---------- continuity hook ----------
 
-    if emotional_mode and depth <= 2 and "No questions" not in extra_rule:
-        extra_rule += "\nInclude one gentle context question to keep conversation flowing."
+    if emotional_mode and depth <= 2 and "No questions" not in ROUTE_RULES[route]:
+        mode_notes += "\nInclude one gentle context question to keep conversation flowing."
 
     # ---------- long emotional message handling ----------
 
     if long_mode and emotional_mode:
-        extra_rule += "\nAcknowledge at least two emotional elements from the message."
+        mode_notes += "\nAcknowledge at least two emotional elements from the message."
 
     # ---------- style energy injection ----------
 
@@ -258,20 +358,13 @@ def build_prompt(raw_text, analysis, memory, convo_summary, search_context=""):
     if search_context:
         search_block = f"\nHelpful background facts (use if relevant):\n{search_context}\n"
 
-    # ---------- final prompt ----------
-
-    return f"""
-{RAPPORT_RULES}
+    # ---------- dynamic tail ----------
 
-{extra_rule}
+    tail = f"""
+{mode_notes}
 
 {style_block}
 
-Reply in 3–5 medium sentences.
-Natural tone. No robotic phrasing.
-No long paragraphs.
-Reply in the SAME language as the user.
-
 Conversation summary:
 {convo_summary}
 
@@ -285,3 +378,21 @@ Detected emotions: {', '.join(emotions)} | overall: {overall}
 User message:
 {raw_text}
 """
+
+    dynamic_tokens = estimate_tokens(tail)
+
+    prompt_token_stats["prompts"] += 1
+    prompt_token_stats["static_tokens"] += STATIC_TOKENS[route]
+    prompt_token_stats["dynamic_tokens"] += dynamic_tokens
+
+    cap = sentence_cap(text)
+
+    return Prompt(
+        route=route,
+        system=SYSTEM_PREFIXES[route],
+        user=tail,
+        sentence_cap=cap,
+        max_tokens=token_budget(cap),
+        static_tokens=STATIC_TOKENS[route],
+        dynamic_tokens=dynamic_tokens
+    )
@@ -0,0 +1,295 @@
+import re
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+# ---------------- PRIORITIES ----------------
+
+# lower runs first: a user waiting on a reply beats background work
+PRIORITY_REPLY = 0
+PRIORITY_BACKGROUND = 1
+
+PRIORITY_NAMES = {PRIORITY_REPLY: "reply", PRIORITY_BACKGROUND: "background"}
+
+POLL_S = 0.02   # async waiters re-check this often when not first in line
+
+
+class RateLimited(RuntimeError):
+    """No request slot within the caller's deadline."""
+
+
+# ---------------- HEADER PARSING ----------------
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_S = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(value):
+    """Groq reset values look like "7.66s", "2m59.56s" or "450ms"."""
+
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_S[unit] for n, unit in parts)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------- TOKEN BUCKET ----------------
+
+class TokenBucket:
+    """
+    `capacity` units refilled evenly over `window_s`; 0 = unlimited until
+    the upstream's headers say otherwise.
+    """
+
+    def __init__(self, capacity, window_s=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / window_s if window_s else 0.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount, now) -> float:
+        blocked = max(0.0, self.blocked_until - now)
+        if not self.capacity:
+            return blocked
+
+        self._refill(now)
+        # a single request larger than the bucket still gets through once full
+        amount = min(amount, self.capacity)
+        short = amount - self.level
+        return max(blocked, short / self.rate if short > 0 else 0.0)
+
+    def take(self, amount):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def give(self, amount):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit, remaining, reset_s, now):
+        # the upstream's view wins when it is tighter than ours
+        if remaining is None:
+            return
+
+        # no local limit: learn one. The upstream refills continuously and
+        # reset is the time until full, so the refill rate follows
+        if not self.capacity and limit and reset_s and remaining < limit:
+            self.capacity = limit
+            self.rate = (limit - remaining) / reset_s
+            self.level = remaining
+            self.updated = now
+
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+        if remaining <= 0 and reset_s:
+            self.blocked_until = max(self.blocked_until, now + reset_s)
+
+
+# ---------------- SCHEDULER ----------------
+
+class RateLimitScheduler:
+    """
+    Admits LLM requests against a request bucket and a token bucket, in
+    priority order. Sync callers block on a condition; async callers sleep
+    on the event loop. Upstream x-ratelimit-* headers and Retry-After
+    tighten the local budgets as responses come back.
+    """
+
+    def __init__(self, requests_per_window=0, tokens_per_window=0, window_s=60.0, name="llm"):
+        self.name = name
+        self.requests = TokenBucket(requests_per_window, window_s)
+        self.tokens = TokenBucket(tokens_per_window, window_s)
+        self.paused_until = 0.0
+
+        self._cond = threading.Condition()
+        self._waiting = []            # heap of (priority, seq)
+        self._seq = itertools.count()
+
+        self.granted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_s = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.timeouts = 0
+        self.pauses = 0
+        self.refunded_tokens = 0
+
+    # ---- admission ----
+
+    def _wait_time(self, cost, now) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_for(1, now),
+            self.tokens.wait_for(cost, now),
+        )
+
+    def _try(self, ticket, cost):
+        """0 when granted, else (seconds to wait, whether that wait is known)."""
+
+        if self._waiting[0] != ticket:
+            return POLL_S, False
+
+        now = time.monotonic()
+        wait = self._wait_time(cost, now)
+        if wait > 0:
+            return wait, True
+
+        heapq.heappop(self._waiting)
+        self.requests.take(1)
+        self.tokens.take(cost)
+        self._cond.notify_all()
+        return 0
+
+    def _leave(self, ticket):
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def _granted(self, priority, started):
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        self.granted[name] = self.granted.get(name, 0) + 1
+        self.wait_s[name] = self.wait_s.get(name, 0.0) + time.monotonic() - started
+
+    def _give_up(self, ticket, cost):
+        self.timeouts += 1
+        self._leave(ticket)
+        raise RateLimited(f"{self.name}: no slot for {cost:.0f} tokens in time")
+
+    def acquire(self, cost, priority=PRIORITY_REPLY, timeout=None):
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        ticket = (priority, next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    result = self._try(ticket, cost)
+                    if result == 0:
+                        self._granted(priority, started)
+                        return cost
+
+                    wait, known = result
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is not None and (left <= 0 or (known and wait > left)):
+                        self._give_up(ticket, cost)
+
+                    # not first in line: woken when the queue moves
+                    self._cond.wait(wait if known else left)
+            except BaseException:
+                self._leave(ticket)
+                raise
+
+    async def acquire_async(self, cost, priority=PRIORITY_REPLY, timeout=None):
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        ticket = (priority, next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+
+        try:
+            while True:
+                with self._cond:
+                    result = self._try(ticket, cost)
+                    if result == 0:
+                        self._granted(priority, started)
+                        return cost
+
+                    wait, known = result
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is not None and (left <= 0 or (known and wait > left)):
+                        self._give_up(ticket, cost)
+
+                await asyncio.sleep(wait if left is None else min(wait, left))
+        except BaseException:
+            with self._cond:
+                self._leave(ticket)
+            raise
+
+    def try_acquire(self, cost) -> bool:
+        """Grant immediately or not at all (never jumps the queue)."""
+
+        with self._cond:
+            if self._waiting or self._wait_time(cost, time.monotonic()) > 0:
+                return False
+            self.requests.take(1)
+            self.tokens.take(cost)
+            return True
+
+    # ---- feedback from the upstream ----
+
+    def release(self, reserved, used):
+        # reservations assume the whole max_tokens; refund what went unused
+        if used is None or used >= reserved:
+            return
+        with self._cond:
+            self.tokens.give(reserved - used)
+            self.refunded_tokens += reserved - used
+            self._cond.notify_all()
+
+    def observe(self, headers):
+        if headers is None:
+            return
+
+        now = time.monotonic()
+        with self._cond:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                bucket.sync(
+                    _number(headers.get(f"x-ratelimit-limit-{kind}")),
+                    _number(headers.get(f"x-ratelimit-remaining-{kind}")),
+                    parse_duration(headers.get(f"x-ratelimit-reset-{kind}")),
+                    now
+                )
+
+    def pause(self, seconds):
+        # a 429's Retry-After holds everyone, not just the caller that hit it
+        if not seconds:
+            return
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.pauses += 1
+
+    # ---- stats ----
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "queued": len(self._waiting),
+                "queued_reply": sum(1 for p, _ in self._waiting if p == PRIORITY_REPLY),
+                "requests_available": round(self.requests.level, 2) if self.requests.capacity else None,
+                "tokens_available": round(self.tokens.level) if self.tokens.capacity else None,
+                "paused_s": round(max(0.0, self.paused_until - now), 3),
+                "granted": dict(self.granted),
+                "wait_s": {k: round(v, 3) for k, v in self.wait_s.items()},
+                "timeouts": self.timeouts,
+                "pauses": self.pauses,
+                "refunded_tokens": self.refunded_tokens,
+            }
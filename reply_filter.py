@@ -1,37 +1,32 @@
 import re
 
+from signals import as_signals
+
 
 # -------- severity detectors --------
 
-def is_grief_text(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "died", "passed away", "lost my", "death", "funeral"
-    ])
+def is_grief_text(text) -> bool:
+    return as_signals(text).has("grief_text")
 
 
-def is_heavy_emotion(text: str) -> bool:
-    t = text.lower()
-    return any(w in t for w in [
-        "frustrated", "overwhelmed", "low", "depressed",
-        "sad", "hurt", "broken", "tired of",
-        "not okay", "cooked", "done", "give up"
-    ])
+def is_heavy_emotion(text) -> bool:
+    return as_signals(text).has("heavy_emotion")
 
 
 # -------- dynamic sentence cap --------
 
-def sentence_cap(user_text: str) -> int:
+def sentence_cap(user_text) -> int:
 
-    words = len(user_text.split())
-    t = user_text.lower().strip()
+    sig = as_signals(user_text)
+    words = len(sig.text.split())
+    t = sig.lowered.strip()
 
     # grief → fuller consolation
-    if is_grief_text(t):
+    if is_grief_text(sig):
         return 4
 
     # distress → longer support
-    if is_heavy_emotion(t):
+    if is_heavy_emotion(sig):
         return 4
 
     # short input → still allow convo hook
@@ -47,24 +42,77 @@ def sentence_cap(user_text: str) -> int:
 
 # -------- limiter --------
 
-def limit_sentences(text: str, user_text: str) -> str:
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+CONTINUITY_QUESTION = " What happened there?"
+
+
+class SentenceLimiter:
+    """
+    Incremental form of limit_sentences for streamed replies.
+
+    feed() returns the sentences completed by each chunk; once `done`
+    is true the rest of the upstream text is not needed. finish() gives
+    the final reply, identical to limit_sentences on the same text.
+    """
+
+    def __init__(self, user_text):
+        self.user_text = user_text
+        self.cap = sentence_cap(user_text)
+        self.sentences = []
+        self._buf = ""
+
+    @property
+    def done(self) -> bool:
+        return len(self.sentences) >= self.cap
+
+    def feed(self, chunk: str):
+
+        if self.done:
+            return []
+
+        self._buf += chunk
+        completed = []
+
+        while not self.done:
+            m = SENTENCE_BREAK.search(self._buf)
+            if not m:
+                break
+
+            part = self._buf[:m.start()].strip()
+            self._buf = self._buf[m.end():]
+
+            if part:
+                self.sentences.append(part)
+                completed.append(part)
+
+        return completed
+
+    def finish(self) -> str:
+
+        # unterminated tail counts as the last sentence
+        tail = self._buf.strip()
+        self._buf = ""
+        if tail and not self.done:
+            self.sentences.append(tail)
+
+        if not self.sentences:
+            return ""
 
-    cap = sentence_cap(user_text)
+        trimmed = " ".join(self.sentences)
 
-    parts = re.split(r'(?<=[.!?])\s+', text.strip())
-    parts = [p.strip() for p in parts if p.strip()]
+        # ensure punctuation
+        if trimmed[-1] not in ".!?":
+            trimmed += "."
 
-    if not parts:
-        return text.strip()
+        # ---- continuity safety net ----
+        if is_heavy_emotion(self.user_text) and "?" not in trimmed:
+            trimmed += CONTINUITY_QUESTION
 
-    trimmed = " ".join(parts[:cap])
+        return trimmed
 
-    # ensure punctuation
-    if trimmed[-1] not in ".!?":
-        trimmed += "."
 
-    # ---- continuity safety net ----
-    if is_heavy_emotion(user_text) and "?" not in trimmed:
-        trimmed += " What happened there?"
+def limit_sentences(text: str, user_text) -> str:
 
-    return trimmed
+    limiter = SentenceLimiter(user_text)
+    limiter.feed(text)
+    return limiter.finish()
@@ -0,0 +1,151 @@
+import time
+import random
+import threading
+from collections import deque
+
+# ---------------- RETRY CLASSIFICATION ----------------
+
+# worth another attempt: rate limits, timeouts and server-side failures;
+# any other 4xx means the request itself is wrong and will fail again
+RETRYABLE_STATUS = frozenset([408, 425, 429, 500, 502, 503, 504])
+
+# of those, the ones that say the upstream itself is unhealthy
+UNHEALTHY_STATUS = frozenset([500, 502, 503, 504])
+
+
+def classify(status: int) -> str:
+    """Map an HTTP status to "ok", "retry" or "fail"."""
+
+    if status == 200:
+        return "ok"
+    if status in RETRYABLE_STATUS:
+        return "retry"
+    return "fail"
+
+
+def retry_after(headers) -> float:
+    """Seconds from a Retry-After header (delta-seconds form), else None."""
+
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------- BACKOFF ----------------
+
+class Deadline:
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # "full jitter": spreads retries from many clients instead of
+    # synchronizing them on the same schedule
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# ---------------- CIRCUIT BREAKER ----------------
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; while
+    open every call is refused for `reset_timeout` seconds, then one probe
+    is let through (half-open). A successful probe closes the circuit, a
+    failed one opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, name="breaker"):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.name = name
+
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_at = 0.0
+
+        self.opened = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+
+            now = time.monotonic()
+
+            if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+
+            # a probe that never reported back (e.g. cancelled) is replaced
+            if self.state == "half_open" and (
+                not self._probing or now - self._probe_at >= self.reset_timeout
+            ):
+                self._probing = True
+                self._probe_at = now
+                return True
+
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                    print(f"Circuit {self.name} open after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opened": self.opened,
+                "short_circuited": self.short_circuited,
+            }
+
+
+# ---------------- LATENCY TRACKING (hedging) ----------------
+
+class LatencyTracker:
+    """Recent successful call latencies, for a percentile-based hedge delay."""
+
+    def __init__(self, size=256, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
@@ -1,4 +1,5 @@
-from llm_client import ask_llm
+from llm_client import ask_llm, is_error_reply
+from rate_limiter import PRIORITY_BACKGROUND
 
 
 def rewrite_if_needed(reply: str) -> str:
@@ -12,6 +13,9 @@ Reply:
 """
 
     try:
-        return ask_llm(check_prompt)
+        rewritten = ask_llm(check_prompt, PRIORITY_BACKGROUND)
     except Exception:
         return reply
+
+    # rate-limited or failed: the original is better than a fallback line
+    return reply if is_error_reply(rewritten) else rewritten
@@ -1,4 +1,33 @@
-import requests
+import os
+import asyncio
+import threading
+from concurrent.futures import Future
+
+import metrics
+from cache import LRUCache, MISSING
+from http_pool import get_session, get_async_client, sync_timeout, async_timeout
+
+SEARCH_TIMEOUT_S = float(os.getenv("SEARCH_TIMEOUT_S", "6"))
+WIKI_SUMMARY_URL = os.getenv("WIKI_SUMMARY_URL", "https://en.wikipedia.org/api/rest_v1/page/summary/")
+
+# ---------------- result cache ----------------
+
+# keyed by the cleaned query; misses (404 / empty extract) expire sooner
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_HIT_TTL_S = float(os.getenv("SEARCH_HIT_TTL_S", "21600"))
+SEARCH_MISS_TTL_S = float(os.getenv("SEARCH_MISS_TTL_S", "900"))
+
+search_cache = LRUCache(max_entries=SEARCH_CACHE_SIZE, name="search")
+
+# concurrent identical lookups share one upstream call
+_inflight = {}
+_inflight_lock = threading.Lock()
+_ainflight = {}
+coalesced = 0
+
+SEARCH_UPSTREAM = metrics.counter(
+    "search_upstream_total", "Wikipedia lookups by outcome", labels=("outcome",)
+)
 
 
 def clean_query(text: str) -> str:
@@ -14,20 +43,129 @@ def clean_query(text: str) -> str:
     return " ".join(words[:5])   # keep short
 
 
-def web_search(query: str) -> str:
+def summary_url(q: str) -> str:
+    return WIKI_SUMMARY_URL + q.replace(' ', '_')
+
+
+def _read_extract(r):
+    """(extract, cacheable) — transient upstream failures are not cached."""
+
+    if r.status_code == 200:
+        extract = r.json().get("extract", "")
+        SEARCH_UPSTREAM.inc(outcome="found" if extract else "not_found")
+        return extract, True
+
+    if r.status_code == 404:
+        SEARCH_UPSTREAM.inc(outcome="not_found")
+        return "", True
+
+    SEARCH_UPSTREAM.inc(outcome="error")
+    return "", False
+
+
+def _remember(q: str, extract: str):
+    ttl = SEARCH_HIT_TTL_S if extract else SEARCH_MISS_TTL_S
+    search_cache.set(q, extract, ttl=ttl)
+
+
+def _fetch(q: str) -> str:
+
+    try:
+        r = get_session().get(summary_url(q), timeout=sync_timeout(SEARCH_TIMEOUT_S))
+        extract, cacheable = _read_extract(r)
+
+        if cacheable:
+            _remember(q, extract)
+        return extract
+
+    except Exception as e:
+        SEARCH_UPSTREAM.inc(outcome="error")
+        print("Wiki error:", e)
+
+    return ""
 
-    q = clean_query(query)
 
-    url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{q.replace(' ', '_')}"
+async def _fetch_async(q: str) -> str:
 
     try:
-        r = requests.get(url, timeout=6)
+        r = await get_async_client().get(
+            summary_url(q), timeout=async_timeout(SEARCH_TIMEOUT_S)
+        )
+        extract, cacheable = _read_extract(r)
 
-        if r.status_code == 200:
-            data = r.json()
-            return data.get("extract", "")
+        if cacheable:
+            _remember(q, extract)
+        return extract
 
     except Exception as e:
+        SEARCH_UPSTREAM.inc(outcome="error")
         print("Wiki error:", e)
 
     return ""
+
+
+def web_search(query: str) -> str:
+    global coalesced
+
+    q = clean_query(query)
+
+    cached = search_cache.get(q)
+    if cached is not MISSING:
+        return cached
+
+    with _inflight_lock:
+        fut = _inflight.get(q)
+        owner = fut is None
+        if owner:
+            fut = _inflight[q] = Future()
+        else:
+            coalesced += 1
+
+    if not owner:
+        return fut.result()
+
+    try:
+        result = _fetch(q)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(q, None)
+
+
+async def web_search_async(query: str) -> str:
+    global coalesced
+
+    q = clean_query(query)
+
+    cached = search_cache.get(q)
+    if cached is not MISSING:
+        return cached
+
+    task = _ainflight.get(q)
+    if task is None:
+        task = _ainflight[q] = asyncio.ensure_future(_fetch_async(q))
+        task.add_done_callback(lambda _: _ainflight.pop(q, None))
+    else:
+        coalesced += 1
+
+    # shield: a caller hitting its stage deadline must not cancel the
+    # shared lookup — it still lands in the cache for the next request
+    return await asyncio.shield(task)
+
+
+def search_stats() -> dict:
+    return {**search_cache.stats(), "coalesced": coalesced}
+
+
+@metrics.collector
+def search_metrics():
+    return [
+        ("search_cache_hits_total", "counter", "Search lookups answered from cache", search_cache.hits),
+        ("search_cache_misses_total", "counter", "Search lookups not in cache", search_cache.misses),
+        ("search_coalesced_total", "counter", "Search lookups that joined an in-flight call", coalesced),
+    ]
@@ -1,17 +1,15 @@
-def should_web_search(text: str) -> bool:
-    t = text.lower()
+from signals import as_signals
+
+
+def should_web_search(text) -> bool:
+    sig = as_signals(text)
 
     # explicit knowledge queries
-    if any(w in t for w in [
-        "who is", "what is", "tell me about",
-        "movie", "film", "song",
-        "actor", "director",
-        "company", "brand"
-    ]):
+    if sig.has("knowledge"):
         return True
 
     # short entity-style statements → likely knowledge
-    words = t.split()
+    words = sig.lowered.split()
     if len(words) <= 6:
         return True
 
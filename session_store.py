@@ -0,0 +1,519 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+import atexit
+from collections import OrderedDict, deque
+
+
+# ---------------- RECORDS ----------------
+
+class Message:
+    """One stored turn. Roles and emotion tags are interned."""
+
+    __slots__ = ("role", "text", "emotion", "ts")
+
+    def __init__(self, role, text, emotion="", ts=None):
+        self.role = sys.intern(role)
+        self.text = text
+        self.emotion = sys.intern(emotion)
+        self.ts = time.time() if ts is None else ts
+
+    def nbytes(self) -> int:
+        # role / emotion are shared interned strings, so only text is owned
+        return sys.getsizeof(self) + sys.getsizeof(self.text) + 24
+
+
+# ---------------- BACKEND INTERFACE ----------------
+
+class SessionStore:
+    """
+    Storage behind memory.py. Each session keeps at most `max_lines`
+    Message records, a lifetime turn counter, and its latest summary
+    with the turn number that summary covers.
+    """
+
+    # reads may wait on disk or on another process; async callers then
+    # keep them off the event loop (memory.store_call)
+    blocking = False
+
+    def __init__(self, max_lines=50):
+        self.max_lines = max_lines
+
+    def append(self, session_id: str, message: Message):
+        raise NotImplementedError
+
+    def recent(self, session_id: str, limit: int):
+        raise NotImplementedError
+
+    def turn_count(self, session_id: str) -> int:
+        raise NotImplementedError
+
+    def save_summary(self, session_id: str, summary: str, through_turn: int, expected_turn=None) -> bool:
+        """
+        Store a summary covering `through_turn` turns. With
+        `expected_turn`, only if the stored summary still covers exactly
+        that many (compare-and-set); returns whether it was written.
+        """
+        raise NotImplementedError
+
+    def summary_state(self, session_id: str):
+        """(summary, turn number it covers) — ("", 0) if none yet."""
+        raise NotImplementedError
+
+    def count(self, session_id: str) -> int:
+        return len(self.recent(session_id, self.max_lines))
+
+    def view(self, session_id: str, n: int, key, build):
+        """
+        build(last_n_messages) for the session. Backends that can tell
+        when a session was last written cache the result until then.
+        """
+        return build(self.recent(session_id, n))
+
+    def stats(self) -> dict:
+        return {}
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+# ---------------- IN-MEMORY ----------------
+
+class Session:
+    __slots__ = (
+        "messages", "turns", "summary", "summarized_turns",
+        "last_seen", "nbytes", "views"
+    )
+
+    def __init__(self, max_lines):
+        self.messages = deque(maxlen=max_lines)   # ring buffer, O(1) append
+        self.turns = 0                            # lifetime, not capped
+        self.summary = ""
+        self.summarized_turns = 0
+        self.last_seen = time.monotonic()
+        self.nbytes = 0
+        self.views = None                         # view key -> built view
+
+
+class InMemoryStore(SessionStore):
+    """
+    Process-local; lost on restart and not shared between workers.
+
+    Sessions live in one LRU index. Whenever a new session is opened,
+    sessions idle for more than `idle_ttl` seconds are dropped, and past
+    `max_sessions` the least recently used go first, so resident memory
+    stays bounded.
+    """
+
+    def __init__(self, max_lines=50, max_sessions=10000, idle_ttl=21600):
+        super().__init__(max_lines)
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    # ---- index ----
+
+    def _touch(self, session_id, create=True):
+        now = time.monotonic()
+        s = self.sessions.get(session_id)
+
+        if s is None:
+            if not create:
+                return None
+            # the index only grows here, so this is where it is trimmed
+            self._evict(now)
+            s = self.sessions[session_id] = Session(self.max_lines)
+        else:
+            self.sessions.move_to_end(session_id)
+
+        s.last_seen = now
+        return s
+
+    def _drop_oldest(self):
+        _, s = self.sessions.popitem(last=False)
+        self.nbytes -= s.nbytes
+
+    def _evict(self, now):
+        # index is in access order, so idle sessions sit at the front
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.last_seen < self.idle_ttl:
+                break
+            self._drop_oldest()
+            self.evicted_idle += 1
+
+        while len(self.sessions) >= self.max_sessions:
+            self._drop_oldest()
+            self.evicted_lru += 1
+
+    # ---- store API ----
+
+    def append(self, session_id, message):
+        size = message.nbytes()
+
+        with self._lock:
+            s = self._touch(session_id)
+
+            if len(s.messages) == s.messages.maxlen:
+                dropped = s.messages[0].nbytes()
+                s.nbytes -= dropped
+                self.nbytes -= dropped
+
+            s.messages.append(message)
+            s.turns += 1
+            s.nbytes += size
+            self.nbytes += size
+            s.views = None
+
+    def recent(self, session_id, limit):
+        with self._lock:
+            s = self._touch(session_id, create=False)
+            if s is None:
+                return []
+
+            msgs = s.messages
+            start = max(0, len(msgs) - limit)
+            return [msgs[i] for i in range(start, len(msgs))]
+
+    def count(self, session_id):
+        with self._lock:
+            s = self.sessions.get(session_id)
+            return len(s.messages) if s else 0
+
+    def view(self, session_id, n, key, build):
+        with self._lock:
+            s = self._touch(session_id, create=False)
+            if s is None:
+                return build([])
+
+            if s.views is None:
+                s.views = {}
+
+            v = s.views.get(key)
+            if v is None:
+                msgs = s.messages
+                start = max(0, len(msgs) - n)
+                v = s.views[key] = build([msgs[i] for i in range(start, len(msgs))])
+
+            return v
+
+    def turn_count(self, session_id):
+        with self._lock:
+            s = self.sessions.get(session_id)
+            return s.turns if s else 0
+
+    def save_summary(self, session_id, summary, through_turn, expected_turn=None):
+        with self._lock:
+            s = self._touch(session_id)
+            if expected_turn is not None and s.summarized_turns != expected_turn:
+                return False
+
+            delta = sys.getsizeof(summary) - sys.getsizeof(s.summary)
+            s.nbytes += delta
+            self.nbytes += delta
+            s.summary = summary
+            s.summarized_turns = through_turn
+            return True
+
+    def summary_state(self, session_id):
+        with self._lock:
+            s = self._touch(session_id, create=False)
+            return (s.summary, s.summarized_turns) if s else ("", 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self.sessions),
+                "messages": sum(len(s.messages) for s in self.sessions.values()),
+                "bytes": self.nbytes,
+                "evicted_idle": self.evicted_idle,
+                "evicted_lru": self.evicted_lru,
+            }
+
+
+# ---------------- SQLITE (WAL) ----------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    emotion TEXT NOT NULL DEFAULT '',
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    turns INTEGER NOT NULL DEFAULT 0,
+    summary TEXT NOT NULL DEFAULT '',
+    summarized_turns INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class SQLiteStore(SessionStore):
+    """
+    Shared by every worker on the host through one WAL-mode database.
+
+    Writes are buffered and flushed in one transaction every
+    `flush_ms` (or once `batch_size` are pending). Reads merge the
+    process's own unflushed writes, so a worker always sees what it
+    just wrote; other workers see it after the next flush.
+    Summaries are the exception and written through (save_summary).
+    """
+
+    blocking = True
+
+    def __init__(self, path, max_lines=50, flush_ms=50, batch_size=256):
+        super().__init__(max_lines)
+        self.path = path
+        self.flush_interval = flush_ms / 1000.0
+        self.batch_size = batch_size
+
+        self._local = threading.local()
+        self._lock = threading.Lock()          # guards the pending buffers
+        self._flush_lock = threading.Lock()    # a flush is atomic to readers
+        self._wake = threading.Event()
+        self._pending = []            # (session_id, Message)
+        self._thread = None
+        self._pid = os.getpid()
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+        atexit.register(self.close)
+
+    # ---- connections ----
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _check_fork(self):
+        # connections, locks and the flush thread must never cross a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self._thread = None
+            self._lock = threading.Lock()
+            self._flush_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---- write-behind ----
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="session-flush", daemon=True
+        )
+        self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print("Session flush failed:", e)
+
+    def append(self, session_id, message):
+        self._check_fork()
+
+        with self._lock:
+            self._pending.append((session_id, message))
+            backlog = len(self._pending)
+
+        self._ensure_flusher()
+        if backlog >= self.batch_size:
+            self._wake.set()
+
+    def save_summary(self, session_id, summary, through_turn, expected_turn=None):
+        self._check_fork()
+
+        # written through, not buffered: summaries are rare, and every
+        # worker may summarize the same session, so the compare-and-set
+        # has to run against the shared row. Flushing first creates it.
+        with self._flush_lock:
+            self._flush()
+
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "INSERT INTO sessions (session_id) VALUES (?) "
+                    "ON CONFLICT(session_id) DO NOTHING",
+                    (session_id,)
+                )
+                sql = "UPDATE sessions SET summary = ?, summarized_turns = ? WHERE session_id = ?"
+                args = (summary, through_turn, session_id)
+                if expected_turn is not None:
+                    sql += " AND summarized_turns = ?"
+                    args += (expected_turn,)
+                written = conn.execute(sql, args).rowcount
+
+        return written == 1
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        if not pending:
+            return
+
+        try:
+            self._write(pending)
+        except sqlite3.Error:
+            # put the batch back so the next flush retries it
+            with self._lock:
+                self._pending = pending + self._pending
+            raise
+
+    def _write(self, pending):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, text, emotion, ts) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (sid, m.role, m.text, m.emotion, m.ts)
+                    for sid, m in pending
+                ]
+            )
+
+            # keep only the newest max_lines rows per touched session
+            for sid in {sid for sid, _ in pending}:
+                conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id <= ("
+                    " SELECT id FROM messages WHERE session_id = ?"
+                    " ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (sid, sid, self.max_lines)
+                )
+
+            turns = {}
+            for sid, _ in pending:
+                turns[sid] = turns.get(sid, 0) + 1
+
+            conn.executemany(
+                "INSERT INTO sessions (session_id, turns) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET turns = turns + excluded.turns",
+                list(turns.items())
+            )
+
+    # ---- reads ----
+
+    def recent(self, session_id, limit):
+        self._check_fork()
+
+        # indexed on (session_id, id): reads only the window, newest first
+        with self._flush_lock:
+            rows = self._conn().execute(
+                "SELECT role, text, emotion, ts FROM messages "
+                "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+
+            with self._lock:
+                unflushed = [m for sid, m in self._pending if sid == session_id]
+
+        records = [Message(*row) for row in reversed(rows)]
+
+        return (records + unflushed)[-limit:]
+
+    def count(self, session_id):
+        self._check_fork()
+
+        with self._flush_lock:
+            (n,) = self._conn().execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+
+            with self._lock:
+                n += sum(1 for sid, _ in self._pending if sid == session_id)
+
+        return min(n, self.max_lines)
+
+    def turn_count(self, session_id):
+        self._check_fork()
+
+        with self._flush_lock:
+            row = self._conn().execute(
+                "SELECT turns FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+
+            with self._lock:
+                unflushed = sum(1 for sid, _ in self._pending if sid == session_id)
+
+        return (row[0] if row else 0) + unflushed
+
+    def summary_state(self, session_id):
+        self._check_fork()
+
+        with self._flush_lock:
+            row = self._conn().execute(
+                "SELECT summary, summarized_turns FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+
+        return tuple(row) if row else ("", 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "pending_writes": len(self._pending),
+            }
+
+    def close(self):
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            print("Session flush failed:", e)
+
+
+# ---------------- FACTORY ----------------
+
+def make_store(kind: str, max_lines: int) -> SessionStore:
+
+    if kind == "sqlite":
+        return SQLiteStore(
+            os.getenv("SESSION_DB_PATH", "sessions.db"),
+            max_lines=max_lines,
+            flush_ms=float(os.getenv("SESSION_FLUSH_MS", "50")),
+            batch_size=int(os.getenv("SESSION_FLUSH_BATCH", "256"))
+        )
+
+    if kind == "memory":
+        return InMemoryStore(
+            max_lines=max_lines,
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+            idle_ttl=float(os.getenv("SESSION_IDLE_TTL_S", "21600"))
+        )
+
+    raise ValueError(f"unknown SESSION_STORE backend: {kind}")
@@ -0,0 +1,229 @@
+import os
+import re
+from typing import NamedTuple
+
+from cache import LRUCache, MISSING
+
+
+# ---------------- KEYWORD TABLES ----------------
+
+# every keyword rule in the service, by signal name. Matching is plain
+# case-insensitive substring containment, same as `any(w in t ...)`.
+
+SIGNAL_PHRASES = {
+
+    # ---- analyzer ----
+    "distress_slang": (
+        "i'm cooked", "im cooked", "i am cooked",
+        "feeling cooked",
+        "i'm done", "im done",
+        "i'm finished", "im finished",
+        "i cant anymore", "i can't anymore",
+        "i give up",
+        "i'm not okay", "im not okay",
+        "this is bad for me",
+    ),
+    "win_slang": (
+        "we cooked",
+        "we are cooking",
+        "we're cooking",
+        "they got cooked",
+        "he got cooked",
+        "she got cooked",
+    ),
+    "grief_phrase": (
+        "died", "passed away", "lost my",
+        "funeral", "death", "put to sleep",
+    ),
+    "cooked": ("cooked",),
+    "self_ref": ("i'm", "im", "i am", "feeling", "so", "too"),
+    "bro_style": ("bro", "dude", "man", "bruh"),
+    "happy_hint": ("yay", "finally", "won", "got it", "success"),
+    "sad_hint": ("sad", "tired", "overwhelmed", "cry", "done"),
+
+    # ---- prompt_builder routing ----
+    "identity": (
+        "who are you", "what are you",
+        "are you a bot", "what can you do",
+    ),
+    "shopping": (
+        "buy", "shop", "shirt", "dress",
+        "wear", "outfit", "choose", "which one",
+    ),
+    "grief": (
+        "died", "passed away", "lost my",
+        "death", "funeral", "my pet", "my dog",
+    ),
+    "injury": (
+        "broke my", "fracture", "injured",
+        "hurt my", "accident",
+    ),
+    "crying": (
+        "i'll cry", "i will cry",
+        "crying", "about to cry",
+    ),
+    "distress_hint": (
+        "i'm done", "im done",
+        "i give up", "cant anymore",
+        "too much", "over it",
+    ),
+    "celebration": (
+        "yay", "yess", "lets go", "let's go",
+        "i got it", "i did it",
+        "finally got", "won",
+    ),
+    "pro_stress": (
+        "delivery", "deadline", "stakeholder",
+        "client", "timeline", "behind schedule",
+        "delay", "escalation", "project risk",
+        "not on track",
+    ),
+
+    # ---- reply_filter severity ----
+    "grief_text": (
+        "died", "passed away", "lost my", "death", "funeral",
+    ),
+    "heavy_emotion": (
+        "frustrated", "overwhelmed", "low", "depressed",
+        "sad", "hurt", "broken", "tired of",
+        "not okay", "cooked", "done", "give up",
+    ),
+
+    # ---- search_trigger ----
+    "knowledge": (
+        "who is", "what is", "tell me about",
+        "movie", "film", "song",
+        "actor", "director",
+        "company", "brand",
+    ),
+
+    # ---- llm_client prompt routing ----
+    "grief_prompt": (
+        "passed away", "died", "lost my",
+        "funeral", "bereavement",
+    ),
+    "distress_prompt": (
+        "strong_distress", "distress",
+        "overwhelmed", "frustrated",
+        "sad", "stress", "not okay",
+    ),
+    "positive_prompt": (
+        "super_happy", "happy", "joy", "positive",
+    ),
+}
+
+# whole-message matches, not substrings
+GOODBYES = frozenset(["bye", "goodbye", "gn", "good night", "see you"])
+
+
+# ---------------- COMPILED MATCHER ----------------
+
+def _trie_regex(phrases) -> str:
+    # prefix-factored alternation: each position is tried against one
+    # branch per leading character, and the longest phrase wins
+    trie = {}
+    for p in phrases:
+        node = trie
+        for ch in p:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        ends = "" in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+
+        if not branches:
+            return ""
+
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends:
+            body = ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+
+    return emit(trie)
+
+
+def _compile():
+    owners = {}
+    for name, phrases in SIGNAL_PHRASES.items():
+        for p in phrases:
+            owners.setdefault(p, set()).add(name)
+
+    # a longest match also implies every phrase contained inside it
+    closure = {}
+    for p in owners:
+        names = set()
+        for q, q_names in owners.items():
+            if q in p:
+                names |= q_names
+        closure[p] = frozenset(names)
+
+    # zero-width lookahead so overlapping phrases are all found
+    pattern = re.compile("(?=(" + _trie_regex(owners) + "))")
+    return pattern, closure
+
+
+_PATTERN, _OWNERS = _compile()
+
+
+def scan(text: str) -> frozenset:
+    """Names of every signal whose phrases occur in `text` (one pass)."""
+
+    hits = set()
+    for m in _PATTERN.finditer(text.lower()):
+        hits |= _OWNERS[m.group(1)]
+    return frozenset(hits)
+
+
+# ---------------- PER-MESSAGE FEATURES ----------------
+
+class MessageSignals(NamedTuple):
+    text: str
+    lowered: str
+    hits: frozenset
+    goodbye: bool
+
+    def has(self, name: str) -> bool:
+        return name in self.hits
+
+
+def compute_signals(text: str) -> MessageSignals:
+    lowered = text.lower()
+    return MessageSignals(
+        text=text,
+        lowered=lowered,
+        hits=scan(lowered),
+        goodbye=lowered.strip() in GOODBYES
+    )
+
+
+# the same message is scanned by routing, search and the analyzer; an
+# entry holds the text and its lowered copy, so the budget is in bytes,
+# and a pasted wall of text is rescanned rather than evicting everything
+SIGNAL_CACHE_SIZE = int(os.getenv("SIGNAL_CACHE_SIZE", "2048"))
+SIGNAL_CACHE_MAX_BYTES = int(os.getenv("SIGNAL_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+SIGNAL_CACHE_MAX_CHARS = int(os.getenv("SIGNAL_CACHE_MAX_CHARS", "4000"))
+
+signal_cache = LRUCache(
+    max_entries=SIGNAL_CACHE_SIZE,
+    max_bytes=SIGNAL_CACHE_MAX_BYTES,
+    sizeof=lambda sig: len(sig.text) + len(sig.lowered),
+    name="signals"
+)
+
+
+def extract_signals(text: str) -> MessageSignals:
+    if len(text) > SIGNAL_CACHE_MAX_CHARS:
+        return compute_signals(text)
+
+    sig = signal_cache.get(text)
+    if sig is MISSING:
+        sig = compute_signals(text)
+        signal_cache.set(text, sig)
+    return sig
+
+
+def as_signals(text_or_signals) -> MessageSignals:
+    if isinstance(text_or_signals, MessageSignals):
+        return text_or_signals
+    return extract_signals(text_or_signals)
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+
+# ---------------- STAGED EXECUTOR ----------------
+
+class Stage:
+    """
+    One independent unit of request work.
+
+    `run` is a zero-argument callable returning an awaitable. Stages with
+    a `deadline` (seconds) are optional: if they miss it or fail, their
+    result is `default` and the request carries on without them.
+    """
+
+    def __init__(self, name, run, deadline=None, default=None):
+        self.name = name
+        self.run = run
+        self.deadline = deadline
+        self.default = default
+
+    @property
+    def optional(self) -> bool:
+        return self.deadline is not None
+
+
+async def run_stages(stages):
+    """
+    Start every stage at once and join them.
+
+    Returns a dict of stage name -> result. Deadlines are measured from
+    the moment the fan-out starts, so the join waits for the slowest
+    required stage, not the sum of all stages.
+    """
+
+    started = time.monotonic()
+    tasks = {s.name: asyncio.create_task(s.run()) for s in stages}
+    results = {}
+
+    try:
+        for s in stages:
+            task = tasks[s.name]
+
+            if not s.optional:
+                results[s.name] = await task
+                continue
+
+            remaining = s.deadline - (time.monotonic() - started)
+
+            try:
+                results[s.name] = await asyncio.wait_for(task, max(remaining, 0))
+            except asyncio.TimeoutError:
+                print(f"Stage '{s.name}' missed its {s.deadline:.2f}s budget — skipped")
+                results[s.name] = s.default
+            except Exception as e:
+                print(f"Stage '{s.name}' failed:", e)
+                results[s.name] = s.default
+
+    finally:
+        # a failed required stage must not leave siblings running
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+
+    return results
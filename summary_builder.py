@@ -1,10 +1,8 @@
 from llm_client import ask_llm
+from rate_limiter import PRIORITY_BACKGROUND
 
 
-def build_convo_summary(context):
-
-    if not context:
-        return ""
+def summary_prompt(context):
 
     joined = "\n".join(context[-30:])
 
@@ -23,4 +21,50 @@ Conversation:
 {joined}
 """
 
-    return ask_llm(prompt)
+    return prompt
+
+
+def incremental_summary_prompt(old_summary, new_turns):
+
+    joined = "\n".join(new_turns)
+
+    prompt = f"""
+Update this conversation summary with the new turns below.
+Keep it to 2 short lines.
+
+Include:
+- main emotional theme
+- main situation topic
+
+Do not give advice.
+Do not change tone.
+Just neutral summary.
+
+Summary so far:
+{old_summary}
+
+New turns:
+{joined}
+"""
+
+    return prompt
+
+
+def build_convo_summary(context):
+
+    if not context:
+        return ""
+
+    return ask_llm(summary_prompt(context), PRIORITY_BACKGROUND)
+
+
+def build_incremental_summary(old_summary, new_turns):
+
+    if not new_turns:
+        return old_summary
+
+    # first summary of a session: nothing to carry forward
+    if not old_summary:
+        return build_convo_summary(new_turns)
+
+    return ask_llm(incremental_summary_prompt(old_summary, new_turns), PRIORITY_BACKGROUND)
@@ -0,0 +1,109 @@
+import os
+import queue
+import threading
+
+from memory import get_window, turn_count, get_summary_state, save_summary
+from summary_builder import build_incremental_summary
+from llm_client import is_error_reply
+import metrics
+
+# summarize once this many turns have piled up since the last summary
+SUMMARY_EVERY_TURNS = int(os.getenv("SUMMARY_EVERY_TURNS", "10"))
+
+
+# ---------------- BACKGROUND SUMMARIZER ----------------
+
+class SummaryScheduler:
+    """
+    Runs conversation summaries off the request path.
+
+    note_turn() is cheap and called after every reply; a session is
+    queued once SUMMARY_EVERY_TURNS new turns exist since its last
+    summary, and never queued twice at the same time. The worker folds
+    only those new turns into the previous summary.
+
+    That dedupe is per process. With several workers on one shared
+    store the same session can be summarized twice; the save is a
+    compare-and-set on the turn the summary started from, so the first
+    one wins and the other is dropped instead of overwriting it.
+    """
+
+    def __init__(self, every=SUMMARY_EVERY_TURNS):
+        self.every = max(1, every)
+
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.completed = 0
+        self.failed = 0
+        self.superseded = 0
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="summary-worker", daemon=True
+                )
+                self._thread.start()
+
+    def note_turn(self, session_id: str) -> bool:
+
+        _, done = get_summary_state(session_id)
+        if turn_count(session_id) - done < self.every:
+            return False
+
+        with self._lock:
+            if session_id in self._queued:
+                return False
+            self._queued.add(session_id)
+
+        self._ensure_worker()
+        self._queue.put(session_id)
+        return True
+
+    def summarize(self, session_id: str) -> bool:
+
+        old_summary, done = get_summary_state(session_id)
+        turns = turn_count(session_id)
+
+        new_turns = get_window(session_id, turns - done)
+        with metrics.span("summary"):
+            summary = build_incremental_summary(old_summary, new_turns)
+        if is_error_reply(summary):
+            raise RuntimeError(summary)
+
+        if not save_summary(session_id, summary, through_turn=turns, expected_turn=done):
+            print("Summary superseded:", session_id)
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            session_id = self._queue.get()
+            try:
+                if self.summarize(session_id):
+                    self.completed += 1
+                else:
+                    self.superseded += 1
+            except Exception as e:
+                print("Summary failed:", e)
+                self.failed += 1
+            finally:
+                with self._lock:
+                    self._queued.discard(session_id)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queued),
+            "completed": self.completed,
+            "failed": self.failed,
+            "superseded": self.superseded,
+        }
+
+
+summary_scheduler = SummaryScheduler()